@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import Set
+from typing import Iterable, Set, Tuple
 
 from traceutils.file2.file2 import File2
 from traceutils.progress.bar import Progress
@@ -7,8 +7,18 @@ from traceutils.progress.bar import Progress
 
 class Alias:
 
-    def __init__(self, filename, include: Set[str] = None, increment=500000):
+    def __init__(self, filename=None, include: Set[str] = None, increment=500000):
         self.filename = filename
+        self.node = {}
+        self.nid = {}
+        self.nextid = 1
+        if filename is not None:
+            self.read(filename, include=include, increment=increment)
+
+    def __repr__(self):
+        return 'Alias<Nodes {:,d} Addrs {:,d}>'.format(len(self.node), len(self.nid))
+
+    def read(self, filename, include: Set[str] = None, increment=500000):
         nodes = defaultdict(set)
         aliases = {}
         pb = Progress(message='Reading aliases', increment=increment, callback=lambda: 'Found {:,d}'.format(len(nodes)))
@@ -27,8 +37,53 @@ class Alias:
                 nodes[nid] = set(addrs)
                 for addr in addrs:
                     aliases[addr] = nid
-        self.node = dict(nodes)
-        self.nid = dict(aliases)
+        self.node.update(nodes)
+        self.nid.update(aliases)
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[str, str]], include: Set[str] = None):
+        alias = cls()
+        alias.add_pairs(pairs, include=include)
+        return alias
+
+    def add_pairs(self, pairs: Iterable[Tuple[str, str]], include: Set[str] = None):
+        parent = {}
+
+        def find(x):
+            root = parent.setdefault(x, x)
+            while root != parent[root]:
+                parent[root] = parent[parent[root]]
+                root = parent[root]
+            return root
+
+        for a, b in pairs:
+            if include is not None and a not in include and b not in include:
+                continue
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[rb] = ra
+        groups = defaultdict(set)
+        for addr in parent:
+            groups[find(addr)].add(addr)
+        for addrs in groups.values():
+            nids = sorted({self.nid[a] for a in addrs if a in self.nid})
+            if nids:
+                nid = nids[0]
+                for other in nids[1:]:
+                    addrs.update(self.node.pop(other))
+                addrs.update(self.node[nid])
+            else:
+                while 'D{}'.format(self.nextid) in self.node:
+                    self.nextid += 1
+                nid = 'D{}'.format(self.nextid)
+            self.node[nid] = addrs
+            for addr in addrs:
+                self.nid[addr] = nid
+
+    def write(self, filename):
+        with File2(filename, 'wt') as f:
+            for nid, addrs in self.node.items():
+                f.write('node {}:  {}\n'.format(nid, ' '.join(sorted(addrs))))
 
     def aliases(self, addr):
         nid = self.nid.get(addr)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+import time
+from argparse import ArgumentParser
+from typing import List
+
+from traceutils.file2.file2 import File2
+from traceutils.radix.ip2as import create_table
+
+import finder
+from candidate_info import CandidateInfo
+from hopview import HopView
+from readers import open_reader
+
+
+FIELDS = ['twos', 'fours', 'ixps', 'nexthop', 'multi', 'echos', 'last', 'nextecho', 'multiecho', 'triplets', 'unreach', 'nounreach', 'spoofing', 'rttls', 'echotwos', 'echofours']
+
+
+def read_traces(filenames: List[str]):
+    traces = []
+    for filename in filenames:
+        with open_reader(filename, finder.ftype) as f:
+            for trace in f:
+                if trace.hops:
+                    trace.prune_private(finder._ip2as)
+                    if trace.hops:
+                        trace.prune_loops()
+                        traces.append(trace)
+    return traces
+
+
+def extract_loop(traces):
+    info = CandidateInfo()
+    for trace in traces:
+        finder.add_trace(info, trace)
+    return info
+
+
+def extract_view(traces, chunksize):
+    info = CandidateInfo()
+    for i in range(0, len(traces), chunksize):
+        finder.add_traces(info, HopView(traces[i:i+chunksize]))
+    return info
+
+
+def extract_files(filenames, vectorized, chunksize):
+    info = CandidateInfo()
+    for filename in filenames:
+        finder.candidates(filename, info=info, vectorized=vectorized, chunksize=chunksize)
+    return info
+
+
+def timed(func, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def compare(before: CandidateInfo, after: CandidateInfo):
+    diffs = [name for name in FIELDS if set(getattr(before, name)) != set(getattr(after, name))]
+    if set(before.dst_asns) != set(after.dst_asns):
+        diffs.append('dst_asns')
+    return diffs
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-f', '--filename', required=True, help='File with one trace file per line.')
+    parser.add_argument('-i', '--ip2as', required=True)
+    parser.add_argument('-c', '--chunksize', type=int, default=finder.CHUNKSIZE)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    parser.add_argument('-m', '--middle-only', action='store_true')
+    args = parser.parse_args()
+    finder.middle_only = args.middle_only
+    finder._ip2as = create_table(args.ip2as)
+    with File2(args.filename) as f:
+        filenames = [line.strip() for line in f if line.strip()]
+    traces = read_traces(filenames)
+    print('Files: {:,d} Traces: {:,d} Hops: {:,d}'.format(len(filenames), len(traces), sum(len(t.hops) for t in traces)))
+    before, tloop = timed(extract_loop, traces, repeat=args.repeat)
+    after, tview = timed(extract_view, traces, args.chunksize, repeat=args.repeat)
+    print('Extraction  loop {:,.0f} traces/s  view {:,.0f} traces/s  speedup {:.2f}x'.format(len(traces) / tloop, len(traces) / tview, tloop / tview))
+    diffs = compare(before, after)
+    fbefore, floop = timed(extract_files, filenames, False, args.chunksize, repeat=args.repeat)
+    fafter, fview = timed(extract_files, filenames, True, args.chunksize, repeat=args.repeat)
+    print('End to end  loop {:,.0f} traces/s  view {:,.0f} traces/s  speedup {:.2f}x'.format(len(traces) / floop, len(traces) / fview, floop / fview))
+    diffs.extend(d for d in compare(fbefore, fafter) if d not in diffs)
+    print('Results match' if not diffs else 'Results differ: {}'.format(', '.join(diffs)))
+
+
+if __name__ == '__main__':
+    main()
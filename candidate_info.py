@@ -1,8 +1,8 @@
 import os
 import pickle
 from collections import defaultdict
-from copy import copy, deepcopy
-from typing import Union, Set, Any, NewType, DefaultDict, Tuple, Dict
+from typing import Union, Set, Any, NewType, DefaultDict, Tuple, Dict, Iterable
+import numpy as np
 import pandas as pd
 
 from traceutils.as2org.as2org import AS2Org
@@ -12,6 +12,11 @@ from traceutils.progress.bar import Progress
 from traceutils.utils.net import otherside as otherside_err, prefix_addrs
 
 from alias import Alias
+from cycles import CycleStore
+from destasns import DestASStore
+from orgs import OrgMap, PeeringOrgs
+from overlay import OverlaySet, snapshot
+from rttl import RTTLTable
 
 
 IXPManagerT = NewType('IXPManager', DefaultDict[str, Set[Tuple[int, str, str]]])
@@ -20,9 +25,14 @@ IXPManagerT = NewType('IXPManager', DefaultDict[str, Set[Tuple[int, str, str]]])
 class IXPManager(defaultdict):
     def __init__(self, *args, **kwargs):
         super().__init__(set, *args, **kwargs)
+        self.owned = set(self)
 
     def copy(self):
-        return IXPManager({k: set(v) for k, v in self.items()})
+        ixps = IXPManager(self)
+        ixps.owned = set()
+        ixps.default_factory = self.default_factory
+        self.owned = set()
+        return ixps
 
     @classmethod
     def from_tuples(cls, tuples):
@@ -31,6 +41,7 @@ class IXPManager(defaultdict):
             if x != y:
                 ixps[x].add((asn, x, y))
         ixps.default_factory = None
+        ixps.owned = set(ixps)
         return ixps
 
     def ixps(self):
@@ -43,10 +54,64 @@ class IXPManager(defaultdict):
             tuples = self[x]
             t = (asn, x, y)
             if t in tuples:
+                if x not in self.owned:
+                    tuples = set(tuples)
+                    self[x] = tuples
+                    self.owned.add(x)
                 tuples.discard(t)
                 if not tuples:
                     del self[x]
 
+    def view(self, keep: Iterable[str]):
+        ixps = IXPManager({x: self[x] for x in keep if x in self})
+        ixps.owned = set()
+        ixps.default_factory = None
+        self.owned = set()
+        return ixps
+
+
+NO_ORG = np.iinfo(np.int64).min
+
+
+class IXPTable:
+
+    def __init__(self, addrs, offsets: np.ndarray, orgs: np.ndarray):
+        self.addrs = addrs
+        self.offsets = offsets
+        self.orgs = orgs
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def __repr__(self):
+        return 'Addrs {:,d} Orgs {:,d}'.format(len(self.addrs), len(self.orgs))
+
+    @classmethod
+    def from_manager(cls, ixps: IXPManager, orgmap: OrgMap):
+        addrs = []
+        rows = []
+        asns = []
+        for x, tuples in ixps.items():
+            row = len(addrs)
+            addrs.append(x)
+            for asn in {asn for asn, _, _ in tuples if asn is not None}:
+                rows.append(row)
+                asns.append(asn)
+        pairs = np.unique(np.column_stack([np.array(rows, dtype=np.int64), orgmap.lookup(asns)]).reshape(-1, 2), axis=0)
+        counts = np.bincount(pairs[:, 0], minlength=len(addrs))
+        offsets = np.zeros(len(addrs) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(addrs, offsets, pairs[:, 1].copy())
+
+    def prevorgs(self, i):
+        return self.orgs[self.offsets[i]:self.offsets[i+1]]
+
+    def keep(self, peeringorgs: PeeringOrgs):
+        porgs = np.array([peeringorgs.addrs.get(x, (None, NO_ORG))[1] for x in self.addrs], dtype=np.int64)
+        rows = np.repeat(np.arange(len(self.addrs)), np.diff(self.offsets))
+        matched = rows[self.orgs == porgs[rows]]
+        return {self.addrs[i] for i in np.unique(matched).tolist()}
+
 
 class CandidateInfo:
 
@@ -55,7 +120,7 @@ class CandidateInfo:
         self.fours = set()
         self.ixps: Union[Set[Any], IXPManagerT] = set()
         self.ixp_tuples = set()
-        self.cycles = set()
+        self.cycles = CycleStore()
         self.nexthop = set()
         self.multi = set()
         self.echos = set()
@@ -72,7 +137,7 @@ class CandidateInfo:
         self.echofours = set()
         self.echotwos = set()
         self.dsts = set()
-        self.dst_asns = set()
+        self.dst_asns = DestASStore()
 
     @classmethod
     def duplicate(cls, info):
@@ -82,13 +147,12 @@ class CandidateInfo:
             if k == 'ixps':
                 newinfo.ixps = info.ixps.copy()
             elif k in dps:
-                try:
-                    setattr(newinfo, k, deepcopy(getattr(info, k)))
-                except TypeError:
-                    print(k)
-                    raise
+                if not isinstance(v, OverlaySet):
+                    v = OverlaySet(v)
+                    setattr(info, k, v)
+                setattr(newinfo, k, v.copy())
             else:
-                setattr(newinfo, k, getattr(info, k))
+                setattr(newinfo, k, v)
         return newinfo
 
     def __repr__(self):
@@ -115,18 +179,18 @@ class CandidateInfo:
         self.ixps = IXPManager.from_tuples(tuples)
 
     def cyaddrs(self):
-        return {x for cycle in self.cycles for x in cycle}
+        return self.cycles.addrset()
+
+    def ixpaddrs(self):
+        if isinstance(self.ixps, IXPManager):
+            return set(self.ixps.ixps())
+        return {x for _, x, y in self.ixps if x != y}
 
     def cyaddrs1(self):
-        return {cycle[0] for cycle in self.cycles}
+        return self.cycles.firstaddrs()
 
-    def destpairs(self, increment=100000):
-        dps = defaultdict(set)
-        pb = Progress(len(self.dst_asns), 'Creating destpairs', increment=increment)
-        for x, dasn in pb.iterator(self.dst_asns):
-            dps[x.addr].add(dasn)
-        dps.default_factory = None
-        return dps
+    def destpairs(self):
+        return self.dst_asns.groups()
 
     def dump(self, filename, prune=True):
         if prune:
@@ -137,7 +201,8 @@ class CandidateInfo:
 
     def fixfours(self):
         self.original_fours = self.fours
-        self.fours = self.fours - self.twos
+        self.fours = snapshot(self.fours)
+        self.fours -= self.twos
 
     def lastaddrs(self):
         return self.last - (self.middle_echo())
@@ -190,7 +255,7 @@ class CandidateInfo:
         info.fixfours()
         return info
 
-    def prune_all(self, valid: Dict[str, int], ixpaddrs: Dict[str, int]=None, as2org: AS2Org=None, alias: Alias=None, verbose=False, percent=False):
+    def prune_all(self, valid: Dict[str, int], ixpaddrs: Union[Dict[str, int], PeeringOrgs]=None, as2org: Union[AS2Org, OrgMap]=None, alias: Alias=None, rttl=False, verbose=False, percent=False):
         middle = self.middle_echo() if percent else None
         rows = []
         if verbose:
@@ -201,43 +266,57 @@ class CandidateInfo:
         self.fixfours()
         if verbose:
             rows.append(self.row('Fix Fours', percent=percent, middle=middle))
+        if rttl:
+            self.prune_rttls()
+            if verbose:
+                rows.append(self.row('Reply TTL', percent=percent, middle=middle))
         self.prune_ixps(ixpaddrs, as2org)
         if verbose:
             rows.append(self.row('IXPs', percent=percent, middle=middle))
-        self.prune_pingtest(valid)
-        if verbose:
-            rows.append(self.row('Ping Test', percent=percent, middle=middle))
-        self.prune_router_loops(alias)
-        if verbose:
-            rows.append(self.row('Router Loops', percent=percent, middle=middle))
+        if valid is not None:
+            self.prune_pingtest(valid)
+            if verbose:
+                rows.append(self.row('Ping Test', percent=percent, middle=middle))
+        if alias is not None:
+            self.prune_router_loops(alias)
+            if verbose:
+                rows.append(self.row('Router Loops', percent=percent, middle=middle))
         if verbose:
             df = pd.DataFrame(rows)
             if percent:
                 df['totalp'] = df.totalp.round(1)
             return df
 
-    def prune_ixps(self, ixpaddrs: Dict[str, int], as2org: AS2Org):
-        prune = set()
-        for x, tuples in self.ixps.items():
-            if x in ixpaddrs:
-                asn = ixpaddrs[x]
-                try:
-                    org = as2org[asn]
-                except:
-                    print(asn, type(asn))
-                    raise
-                orgs = {as2org[asn] for asn, _, _ in tuples if asn is not None}
-                if org not in orgs:
-                    prune.add(x)
-            else:
-                prune.add(x)
-        for x in prune:
-            del self.ixps[x]
+    def prune_family(self, ipv4=True, ipv6=True):
+        if ipv4 and ipv6:
+            return
+        self.twos -= {a for a in self.twos if (':' in a) != ipv6}
+        self.fours -= {a for a in self.fours if (':' in a) != ipv6}
+        self.ixps = self.ixps.view(x for x in self.ixps if (':' in x) == ipv6)
+
+    def prune_middle(self, middle=None):
+        if middle is None:
+            middle = self.middle_echo()
+        self.twos -= {a for a in self.twos if a not in middle}
+        self.fours -= {a for a in self.fours if a not in middle}
+        self.ixps = self.ixps.view(x for x in self.ixps if x in middle)
+
+    def prune_ixps(self, ixpaddrs: Union[Dict[str, int], PeeringOrgs], as2org: Union[AS2Org, OrgMap]):
+        peeringorgs = PeeringOrgs.create(ixpaddrs, as2org)
+        table = IXPTable.from_manager(self.ixps, peeringorgs.orgmap)
+        self.ixps = self.ixps.view(table.keep(peeringorgs))
 
     def prune_pingtest(self, valid: Dict[str, int]):
         prune = {addr for addr in self.fours if valid.get(addr, 2) <= 1}
         self.fours -= prune
 
+    def prune_rttls(self, table: RTTLTable = None):
+        if table is None:
+            table = self.rttl_table()
+        same = table.same_router()
+        self.fours -= same
+        self.twos -= same
+
     def prune_spoofing(self):
         unreach_only = self.unreach_only()
         self.fours -= unreach_only
@@ -314,12 +393,7 @@ class CandidateInfo:
         self.echos -= self.last
 
     def cycle_candidates(self):
-        cfas = set()
-        for cycle in self.cycles:
-            for x, y in zip(cycle, cycle[1:]):
-                if y == otherside(x, 2) or y == otherside(x, 4):
-                    cfas.add(x)
-        return cfas
+        return self.cycles.candidates()
 
     def row(self, name=None, percent=False, middle=None, decimal=1, extras=False):
         # ixpset = set(self.ixps.ixps())
@@ -344,9 +418,12 @@ class CandidateInfo:
                 d['middle'] = len(middle)
         return pd.Series(d, name=name)
 
+    def rttl_table(self):
+        return RTTLTable.from_tuples(self.rttls).group()
+
     def ttl_dict(self):
         d = defaultdict(set)
-        for x, y, xrttl, yrttl in self.rttls:
+        for _, x, y, _, xrttl, yrttl in self.rttls:
             d[x, y].add((xrttl, yrttl))
         d.default_factory = None
         return d
@@ -401,8 +478,15 @@ class LastInfo:
         if candidates is None:
             candidates = CandidateInfo.duplicate(oldinfo.candidates)
         info = cls(candidates)
-        for k, v in vars(info).items():
-            setattr(info, k, deepcopy(getattr(oldinfo, k)))
+        for k, v in vars(oldinfo).items():
+            if k == 'candidates':
+                continue
+            if isinstance(v, (set, OverlaySet)):
+                if not isinstance(v, OverlaySet):
+                    v = OverlaySet(v)
+                    setattr(oldinfo, k, v)
+                v = v.copy()
+            setattr(info, k, v)
         return info
 
     @classmethod
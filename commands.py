@@ -6,7 +6,12 @@ def shmuxf(vps):
     return ' '.join(sorted(vps))
 
 
-def command(infile, outfile, ctype, bz2=False, batch=True, nowait=True, vps=None):
+def arksync(local, remote, vps):
+    directory = '/usr/local/ark/activity/vrfinder/'
+    return 'arksync --activity=vrfinder --max-fast-attempts=1 --include={} {} %MON:{}{}'.format(arksyncf(vps), local, directory, remote)
+
+
+def command(infile, outfile, ctype, bz2=False, batch=True, nowait=True, vps=None, pps=100):
     scamper = '/usr/local/ark/pkg/scamper-cvs-20181025/bin/scamper'
     if ctype == 'ping':
         scom = 'ping -c 2 -o 1'
@@ -18,7 +23,7 @@ def command(infile, outfile, ctype, bz2=False, batch=True, nowait=True, vps=None
     infile = '{}{}'.format(directory, infile)
     outfile = '{}{}'.format(directory, outfile)
     out = '-' if bz2 else outfile
-    com = "shmux -c '{} -o {} -O warts -p 100 -c \"{}\" -f {}".format(scamper, out, scom, infile)
+    com = "shmux -c '{} -o {} -O warts -p {} -c \"{}\" -f {}".format(scamper, out, pps, scom, infile)
     com += ' {}> /dev/null'.format(2 if bz2 else '&')
     if bz2:
         com += ' | bzip2 > {}'.format(outfile)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+import os
+from argparse import ArgumentParser
+from multiprocessing.pool import Pool
+from typing import List
+
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
+from traceutils.scamper.warts import WartsReader
+
+from candidate_info import CandidateInfo, otherside
+from confirm import ConfirmInfo
+from cycletest import CycleInfo, TWO_FALSE, TWO_TRUE, FOUR_FALSE, FOUR_TRUE
+from finder import are_adjacent, valid_pair
+
+
+class CompletionInfo:
+
+    def __init__(self):
+        self.twos = set()
+        self.fours = set()
+        self.tuples = set()
+        self.completed = set()
+        self.cycle = CycleInfo()
+
+    def __repr__(self):
+        return '2 {:,d} 4 {:,d} C {:,d} {}'.format(len(self.twos), len(self.fours), len(self.completed), self.cycle)
+
+    def update(self, info):
+        self.twos.update(info.twos)
+        self.fours.update(info.fours)
+        self.tuples.update(info.tuples)
+        self.completed.update(info.completed)
+        self.cycle.update(info.cycle)
+
+    def confirm_info(self) -> ConfirmInfo:
+        info = ConfirmInfo()
+        info.twos = self.twos
+        info.fours = self.fours
+        info.completed = self.completed
+        return info
+
+    def last_info(self) -> CandidateInfo:
+        info = CandidateInfo()
+        info.twos = self.twos
+        info.fours = self.fours
+        info.tuples = self.tuples
+        return info
+
+    def dump(self, confirm=None, last=None, cycle=None):
+        for filename in [confirm, last, cycle]:
+            if filename is not None:
+                directory = os.path.dirname(filename)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+        if confirm is not None:
+            self.confirm_info().dump(confirm)
+        if last is not None:
+            self.last_info().dump(last, prune=True)
+        if cycle is not None:
+            self.cycle.dump(cycle)
+
+
+def add_trace(info: CompletionInfo, trace):
+    hops = trace.hops
+    if not hops:
+        return
+    dst = trace.dst
+    if trace.stop_reason == 'COMPLETED':
+        if len(hops) >= 2:
+            x = hops[-2]
+            y = hops[-1]
+            xaddr = x.addr
+            yaddr = y.addr
+            info.completed.add(yaddr)
+            xb = x.set_packed()
+            yb = y.set_packed()
+            if are_adjacent(xb, yb):
+                size = valid_pair(xb, yb)
+                if size == -2 or size == 2:
+                    info.twos.add(xaddr)
+                    info.tuples.add((xaddr, yaddr))
+                elif size == -4 or size == 4:
+                    info.fours.add(xaddr)
+                    info.tuples.add((xaddr, yaddr))
+            if yaddr == dst:
+                if xaddr == otherside(dst, 4):
+                    info.cycle.mark(xaddr, FOUR_TRUE)
+                elif xaddr == otherside(dst, 2):
+                    info.cycle.mark(xaddr, TWO_TRUE)
+    else:
+        yaddr = hops[-1].addr
+        if yaddr == otherside(dst, 4):
+            info.cycle.mark(yaddr, FOUR_FALSE)
+        elif yaddr == otherside(dst, 2):
+            info.cycle.mark(yaddr, TWO_FALSE)
+
+
+def analyze(filename):
+    info = CompletionInfo()
+    with WartsReader(filename, ping=False) as f:
+        for trace in f:
+            add_trace(info, trace)
+    return info
+
+
+def analyze_parallel(files: List[str], poolsize=35):
+    info = CompletionInfo()
+    pb = Progress(len(files), message='', callback=info.__repr__)
+    with Pool(max(1, min(poolsize, len(files)))) as pool:
+        for newinfo in pb.iterator(pool.imap_unordered(analyze, files)):
+            info.update(newinfo)
+    return info
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-f', '--filename', required=True)
+    parser.add_argument('-c', '--confirm', help='Write the confirm.py output here.')
+    parser.add_argument('-l', '--last', help='Write the lastfinder.py output here.')
+    parser.add_argument('-y', '--cycle', help='Write the cycletest.py output here.')
+    parser.add_argument('-p', '--poolsize', type=int, default=40)
+    args = parser.parse_args()
+    files = []
+    with File2(args.filename) as f:
+        for line in f:
+            line = line.strip()
+            files.append(line)
+    print('Files: {:,d}'.format(len(files)))
+    info = analyze_parallel(files, poolsize=args.poolsize)
+    info.dump(confirm=args.confirm, last=args.last, cycle=args.cycle)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import os
+import pickle
 from argparse import ArgumentParser
 from collections import defaultdict
 from multiprocessing.pool import Pool
@@ -31,6 +32,20 @@ class ConfirmInfo:
         self.fours.update(info.fours)
         self.completed.update(info.completed)
 
+    def dump(self, filename):
+        with open(filename, 'wb') as f:
+            pickle.dump({'twos': self.twos, 'fours': self.fours, 'completed': self.completed}, f)
+
+    @classmethod
+    def load(cls, filename):
+        info = cls()
+        with open(filename, 'rb') as f:
+            d = pickle.load(f)
+        info.twos = d['twos']
+        info.fours = d['fours']
+        info.completed = d['completed']
+        return info
+
 def candidates_parallel(files: List[str], poolsize=35):
     info = ConfirmInfo()
     pb = Progress(len(files), message='', callback=info.__repr__)
@@ -93,7 +108,7 @@ def main():
     directory = os.path.dirname(args.output)
     if directory:
         os.makedirs(directory, exist_ok=True)
-    info.dump(args.output, prune=True)
+    info.dump(args.output)
 
 if __name__ == '__main__':
     main()
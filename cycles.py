@@ -0,0 +1,121 @@
+from socket import inet_pton, AF_INET, AF_INET6
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+
+
+def canonical(cycle: Tuple[str, ...]) -> Tuple[str, ...]:
+    # Closed loops are rotated to start at their smallest address, so the same loop entered at different hops is stored once
+    if len(cycle) < 3 or cycle[0] != cycle[-1]:
+        return cycle
+    body = cycle[:-1]
+    first = min(body)
+    rotation = min(body[i:] + body[:i] for i, addr in enumerate(body) if addr == first)
+    return rotation + rotation[:1]
+
+
+def split_addr(addr: str):
+    try:
+        packed = inet_pton(AF_INET6 if ':' in addr else AF_INET, addr)
+    except OSError:
+        return None, 0
+    return packed[:-1], packed[-1]
+
+
+class CycleStore:
+
+    def __init__(self, cycles: Iterable[Tuple[str, ...]] = None):
+        self.addrs: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self.cycles: Set[Tuple[int, ...]] = set()
+        self.edges: Set[Tuple[int, int]] = set()
+        self.firsts: Set[int] = set()
+        self.prefixes: Dict[bytes, int] = {}
+        self.prefix: List[int] = []
+        self.last: List[int] = []
+        if cycles is not None:
+            self.update(cycles)
+
+    def __repr__(self):
+        return 'CycleStore<Cycles {:,d} Addrs {:,d} Edges {:,d}>'.format(len(self.cycles), len(self.addrs), len(self.edges))
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def __iter__(self) -> Iterator[Tuple[str, ...]]:
+        addrs = self.addrs
+        for cycle in self.cycles:
+            yield tuple(addrs[i] for i in cycle)
+
+    def __contains__(self, addr):
+        return addr in self.ids
+
+    def __getstate__(self):
+        cycles = list(self.cycles)
+        offsets = np.cumsum([0] + [len(c) for c in cycles]).astype(np.int64)
+        flat = np.fromiter((i for c in cycles for i in c), dtype=np.int32, count=int(offsets[-1]))
+        return {'addrs': self.addrs, 'flat': flat, 'offsets': offsets, 'firsts': np.array(sorted(self.firsts), dtype=np.int32)}
+
+    def __setstate__(self, state):
+        self.__init__()
+        addrs = state['addrs']
+        flat = state['flat'].tolist()
+        offsets = state['offsets'].tolist()
+        for i in range(len(offsets) - 1):
+            self.add(tuple(addrs[j] for j in flat[offsets[i]:offsets[i+1]]), first=False)
+        self.firsts.update(self.intern(addrs[j]) for j in state['firsts'].tolist())
+
+    def intern(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.addrs)
+            self.ids[addr] = i
+            self.addrs.append(addr)
+            key, last = split_addr(addr)
+            if key is None:
+                self.prefix.append(-1 - i)
+            else:
+                self.prefix.append(self.prefixes.setdefault(key, len(self.prefixes)))
+            self.last.append(last)
+        return i
+
+    def add(self, cycle: Tuple[str, ...], first=True):
+        if not cycle:
+            return
+        if first:
+            self.firsts.add(self.intern(cycle[0]))
+        ids = tuple(self.intern(addr) for addr in canonical(cycle))
+        if ids not in self.cycles:
+            self.cycles.add(ids)
+            self.edges.update(zip(ids, ids[1:]))
+
+    def update(self, cycles):
+        if isinstance(cycles, CycleStore):
+            for cycle in cycles:
+                self.add(cycle, first=False)
+            self.firsts.update(self.intern(cycles.addrs[i]) for i in cycles.firsts)
+        else:
+            for cycle in cycles:
+                self.add(cycle)
+
+    def addrset(self):
+        return set(self.ids)
+
+    def firstaddrs(self):
+        return {self.addrs[i] for i in self.firsts}
+
+    def edge_arrays(self):
+        if not self.edges:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        edges = np.array(list(self.edges), dtype=np.int32)
+        return edges[:, 0], edges[:, 1]
+
+    def candidates(self) -> Set[str]:
+        src, dst = self.edge_arrays()
+        prefix = np.array(self.prefix, dtype=np.int64)
+        last = np.array(self.last, dtype=np.uint8)
+        xlast = last[src]
+        diff = xlast ^ last[dst]
+        pair = (diff == 1) | ((diff == 3) & ((xlast % 4 == 1) | (xlast % 4 == 2)))
+        found = src[(prefix[src] == prefix[dst]) & pair]
+        return {self.addrs[i] for i in np.unique(found).tolist()}
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 import os
+import pickle
 from argparse import ArgumentParser
 from collections import defaultdict
 from multiprocessing.pool import Pool
 from os.path import basename
 from typing import List, Dict
 
+import numpy as np
 from traceutils.file2.file2 import File2
 from traceutils.progress.bar import Progress
 from traceutils.scamper.hop import ICMPType
@@ -15,39 +17,92 @@ from traceutils.utils.net import otherside
 from finder import are_adjacent, valid_pair
 
 
+TWO_FALSE = 1
+TWO_TRUE = 2
+FOUR_FALSE = 4
+FOUR_TRUE = 8
+
+
 class CycleInfo:
 
-    def __init__(self):
-        self.fours = {}
-        self.twos = {}
+    def __init__(self, addrs: List[str] = None, flags: np.ndarray = None):
+        self.addrs = []
+        self.ids = {}
+        self._flags = np.zeros(1024, dtype=np.uint8)
+        if addrs is not None:
+            for addr in addrs:
+                self.intern(addr)
+            self.flags[:] = flags
 
     def __repr__(self):
-        return 'Twos {:,d} Fours {:,d}'.format(len(self.twos), len(self.fours))
+        flags = self.flags
+        return 'Twos {:,d} Fours {:,d}'.format(np.count_nonzero(flags & (TWO_FALSE | TWO_TRUE)), np.count_nonzero(flags & (FOUR_FALSE | FOUR_TRUE)))
+
+    def __getstate__(self):
+        return {'addrs': self.addrs, 'flags': self.flags.copy()}
+
+    def __setstate__(self, state):
+        self.__init__(state['addrs'], state['flags'])
+
+    @property
+    def flags(self) -> np.ndarray:
+        return self._flags[:len(self.addrs)]
+
+    def intern(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.addrs)
+            if i == len(self._flags):
+                self._flags = np.concatenate([self._flags, np.zeros(len(self._flags), dtype=np.uint8)])
+            self.ids[addr] = i
+            self.addrs.append(addr)
+        return i
+
+    def mark(self, addr: str, flag: int):
+        i = self.intern(addr)
+        self._flags[i] |= flag
+
+    def results(self, false_flag, true_flag) -> Dict[str, bool]:
+        flags = self.flags
+        found = np.flatnonzero(flags & (false_flag | true_flag)).tolist()
+        return {self.addrs[i]: bool(flags[i] & true_flag) for i in found}
+
+    @property
+    def twos(self):
+        return self.results(TWO_FALSE, TWO_TRUE)
+
+    @property
+    def fours(self):
+        return self.results(FOUR_FALSE, FOUR_TRUE)
 
     def badfour(self):
-        return {a for a, b in self.fours.items() if not b}
+        flags = self.flags
+        found = np.flatnonzero((flags & (FOUR_FALSE | FOUR_TRUE)) == FOUR_FALSE)
+        return {self.addrs[i] for i in found.tolist()}
 
     def update(self, info):
-        update(self.fours, info.fours)
-        update(self.twos, info.twos)
+        # True wins for an address, so OR-ing the per-file flags gives the same result in any order
+        if not info.addrs:
+            return
+        ids = np.fromiter((self.intern(addr) for addr in info.addrs), dtype=np.int64, count=len(info.addrs))
+        self._flags[ids] |= info.flags
 
+    def dump(self, filename):
+        with open(filename, 'wb') as f:
+            pickle.dump({'addrs': self.addrs, 'flags': self.flags, 'twos': self.twos, 'fours': self.fours}, f)
 
-def update(old: Dict[str, bool], new: Dict[str, bool]):
-    for addr, b in new.items():
-        if not addr in old:
-            old[addr] = b
-        else:
-            borig = old[addr]
-            if b != borig:
-                if not borig:
-                    old[addr] = b
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            d = pickle.load(f)
+        return cls(d['addrs'], d['flags'])
 
 
 def candidates_parallel(files: List[str], poolsize=35):
     info = CycleInfo()
     pb = Progress(len(files), message='', callback=info.__repr__)
-    with Pool(poolsize) as pool:
-        for newinfo in pb.iterator(pool.imap(candidates, files)):
+    with Pool(max(1, min(poolsize, len(files)))) as pool:
+        for newinfo in pb.iterator(pool.imap_unordered(candidates, files)):
             info.update(newinfo)
     return info
 
@@ -75,16 +130,16 @@ def candidates(filename):
                         yaddr = y.addr
                         if yaddr == dst:
                             if xaddr == dfour:
-                                info.fours[xaddr] = True
+                                info.mark(xaddr, FOUR_TRUE)
                             elif xaddr == dtwo:
-                                info.twos[xaddr] = True
+                                info.mark(xaddr, TWO_TRUE)
                 else:
                     y = trace.hops[-1]
                     yaddr = y.addr
                     if yaddr == dfour:
-                        info.fours[yaddr] = False
+                        info.mark(yaddr, FOUR_FALSE)
                     elif yaddr == dtwo:
-                        info.twos[yaddr] = False
+                        info.mark(yaddr, TWO_FALSE)
     return info
 
 
@@ -124,7 +179,7 @@ def main():
     directory = os.path.dirname(args.output)
     if directory:
         os.makedirs(directory, exist_ok=True)
-    info.dump(args.output, prune=True)
+    info.dump(args.output)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+from argparse import ArgumentParser
+from multiprocessing.pool import Pool
+from typing import Iterable, Iterator, List, Set, Tuple
+
+import orjson
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
+from traceutils.scamper.warts import WartsReader
+
+from alias import Alias
+
+
+def iter_json(lines: Iterable[bytes]) -> Iterator[dict]:
+    # sc_warts2json writes one record per line, but saved results may be pretty printed
+    buf = []
+    depth = 0
+    for line in lines:
+        if not buf:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped[:1] == b'{' and stripped[-1:] == b'}':
+                try:
+                    yield orjson.loads(stripped)
+                    continue
+                except orjson.JSONDecodeError:
+                    pass
+        buf.append(line)
+        depth += line.count(b'{') - line.count(b'}')
+        if depth <= 0:
+            yield orjson.loads(b''.join(buf))
+            buf = []
+            depth = 0
+    if buf and b''.join(buf).strip():
+        yield orjson.loads(b''.join(buf))
+
+
+def read_json(filename) -> Iterator[dict]:
+    with File2(filename, 'rb') as f:
+        yield from iter_json(f)
+
+
+def read_warts(filename) -> Iterator[dict]:
+    f = WartsReader(filename, trace=False, ping=False)
+    f.open()
+    try:
+        for line in f.raw():
+            yield line if isinstance(line, dict) else orjson.loads(line)
+    finally:
+        f.close()
+
+
+def read_records(filename) -> Iterator[dict]:
+    if '.warts' in filename:
+        return read_warts(filename)
+    return read_json(filename)
+
+
+def strip_prefixlen(addr: str):
+    return addr.partition('/')[0]
+
+
+def record_pair(j: dict):
+    if j.get('type') != 'dealias' or j.get('result') != 'aliases':
+        return None
+    a = j.get('a')
+    # prefixscan reports the alias it found in ab, while mercator and ally compare a and b directly
+    b = j.get('ab') or j.get('b')
+    if not a or not b:
+        return None
+    a, b = strip_prefixlen(a), strip_prefixlen(b)
+    if a == b:
+        return None
+    return (a, b) if a < b else (b, a)
+
+
+def alias_pairs(records: Iterable[dict]) -> Iterator[Tuple[str, str]]:
+    for j in records:
+        pair = record_pair(j)
+        if pair is not None:
+            yield pair
+
+
+def file_pairs(filename) -> Set[Tuple[str, str]]:
+    return set(alias_pairs(read_records(filename)))
+
+
+def read_files(filenames: List[str], poolsize=20) -> Set[Tuple[str, str]]:
+    pairs = set()
+    pb = Progress(len(filenames), 'Reading dealias results', callback=lambda: 'Pairs {:,d}'.format(len(pairs)))
+    with Pool(max(1, min(poolsize, len(filenames)))) as pool:
+        for newpairs in pb.iterator(pool.imap_unordered(file_pairs, filenames)):
+            pairs.update(newpairs)
+    return pairs
+
+
+def create_alias(filenames: List[str], alias: Alias = None, include: Set[str] = None, poolsize=20) -> Alias:
+    pairs = read_files(filenames, poolsize=poolsize)
+    if alias is None:
+        alias = Alias()
+    alias.add_pairs(pairs, include=include)
+    return alias
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('files', nargs='+', help='Prefixscan JSON or dealias warts files.')
+    parser.add_argument('-a', '--aliases', help='Existing ITDK nodes file to merge the pairs into.')
+    parser.add_argument('-o', '--output', required=True, help='Write the merged nodes file here.')
+    parser.add_argument('-p', '--poolsize', type=int, default=20)
+    args = parser.parse_args()
+    alias = Alias(args.aliases) if args.aliases else None
+    alias = create_alias(args.files, alias=alias, poolsize=args.poolsize)
+    print(alias)
+    alias.write(args.output)
+
+
+if __name__ == '__main__':
+    main()
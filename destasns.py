@@ -0,0 +1,140 @@
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+
+
+# Pairs are packed as id << ASN_BITS | (asn + ASN_OFFSET) so a single int64 sort groups and dedupes them
+ASN_BITS = 33
+ASN_OFFSET = 1 << 32
+ASN_MASK = (1 << ASN_BITS) - 1
+
+
+class DestASStore:
+
+    def __init__(self, pairs: Iterable[Tuple[str, int]] = None):
+        self.addrs: List[str] = []
+        self.ids: Dict[str, int] = {}
+        self._buffer = np.zeros(1024, dtype=np.int64)
+        self._size = 0
+        self._packed = np.zeros(0, dtype=np.int64)
+        self._offsets = None
+        if pairs is not None:
+            self.update(pairs)
+
+    def __repr__(self):
+        return 'DestASStore<Addrs {:,d} Pairs {:,d}>'.format(len(self.addrs), len(self))
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        addrs = self.addrs
+        for i, asn in zip(self.addr_ids.tolist(), self.asns.tolist()):
+            yield addrs[i], asn
+
+    def __contains__(self, addr):
+        return addr in self.ids
+
+    def __getstate__(self):
+        return {'addrs': self.addrs, 'packed': self.packed}
+
+    def __setstate__(self, state):
+        self.__init__()
+        for addr in state['addrs']:
+            self.intern(addr)
+        self._packed = state['packed']
+
+    def intern(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.addrs)
+            self.ids[addr] = i
+            self.addrs.append(addr)
+        return i
+
+    def reserve(self, n):
+        # A full buffer is first folded into the sorted pairs, and only grows once the pairs outgrow it
+        if self._size + n > len(self._buffer):
+            self.compact()
+            size = len(self._buffer)
+            while n > size or len(self._packed) > size:
+                size *= 2
+            if size > len(self._buffer):
+                self._buffer = np.zeros(size, dtype=np.int64)
+
+    def append(self, packed: np.ndarray):
+        self.reserve(len(packed))
+        end = self._size + len(packed)
+        self._buffer[self._size:end] = packed
+        self._size = end
+
+    def add(self, addr: str, asn: int):
+        self.reserve(1)
+        self._buffer[self._size] = (self.intern(addr) << ASN_BITS) | (asn + ASN_OFFSET)
+        self._size += 1
+
+    def extend(self, addrs: List[str], asns: np.ndarray):
+        ids = np.fromiter((self.intern(addr) for addr in addrs), dtype=np.int64, count=len(addrs))
+        self.append((ids << ASN_BITS) | (np.asarray(asns, dtype=np.int64) + ASN_OFFSET))
+
+    def update(self, pairs):
+        if isinstance(pairs, DestASStore):
+            if not pairs.addrs:
+                return
+            remap = np.fromiter((self.intern(addr) for addr in pairs.addrs), dtype=np.int64, count=len(pairs.addrs))
+            packed = pairs.packed
+            self.append((remap[packed >> ASN_BITS] << ASN_BITS) | (packed & ASN_MASK))
+        else:
+            for addr, asn in pairs:
+                self.add(addr, asn)
+
+    def compact(self):
+        # Sorting merges the pending buffer into the deduplicated pairs, grouped by address id
+        if self._size:
+            self._packed = np.unique(np.concatenate([self._packed, self._buffer[:self._size]]))
+            self._size = 0
+            self._offsets = None
+
+    @property
+    def packed(self) -> np.ndarray:
+        self.compact()
+        return self._packed
+
+    @property
+    def addr_ids(self) -> np.ndarray:
+        return self.packed >> ASN_BITS
+
+    @property
+    def asns(self) -> np.ndarray:
+        return (self.packed & ASN_MASK) - ASN_OFFSET
+
+    @property
+    def offsets(self) -> np.ndarray:
+        self.compact()
+        if self._offsets is None or len(self._offsets) != len(self.addrs) + 1:
+            counts = np.bincount(self.addr_ids, minlength=len(self.addrs))
+            self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return self._offsets
+
+    def counts(self) -> Dict[str, int]:
+        counts = np.diff(self.offsets)
+        return {self.addrs[i]: int(counts[i]) for i in np.flatnonzero(counts).tolist()}
+
+    def count(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            return 0
+        offsets = self.offsets
+        return int(offsets[i+1] - offsets[i])
+
+    def dests(self, addr: str) -> Set[int]:
+        i = self.ids.get(addr)
+        if i is None:
+            return set()
+        offsets = self.offsets
+        return set(self.asns[offsets[i]:offsets[i+1]].tolist())
+
+    def groups(self) -> Dict[str, Set[int]]:
+        offsets = self.offsets.tolist()
+        asns = self.asns.tolist()
+        return {addr: set(asns[offsets[i]:offsets[i+1]]) for i, addr in enumerate(self.addrs) if offsets[i+1] > offsets[i]}
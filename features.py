@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+import os
+import pickle
+from argparse import ArgumentParser
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candidate_info import CandidateInfo
+
+
+TWO = 1 << 0
+FOUR = 1 << 1
+IXP = 1 << 2
+NEXTHOP = 1 << 3
+MULTI = 1 << 4
+ECHO = 1 << 5
+LAST = 1 << 6
+NEXTECHO = 1 << 7
+MULTIECHO = 1 << 8
+CYCLE = 1 << 9
+UNREACH = 1 << 10
+NOUNREACH = 1 << 11
+SPOOFING = 1 << 12
+ECHOTWO = 1 << 13
+ECHOFOUR = 1 << 14
+
+FLAGS = {
+    'twos': TWO, 'fours': FOUR, 'nexthop': NEXTHOP, 'multi': MULTI, 'echos': ECHO, 'last': LAST,
+    'nextecho': NEXTECHO, 'multiecho': MULTIECHO, 'unreach': UNREACH, 'nounreach': NOUNREACH,
+    'spoofing': SPOOFING, 'echotwos': ECHOTWO, 'echofours': ECHOFOUR
+}
+
+COLUMNS = ['flags', 'valid', 'trip_offsets', 'trip_w', 'trip_y', 'dasn_offsets', 'dasns', 'rttl_offsets', 'rttl_w', 'rttl_y', 'rttl_ttls']
+
+
+def csr(n, pairs: Iterable[Tuple[int, Tuple]], width: int, dtype=np.int64):
+    rows = defaultdict(list)
+    for i, value in pairs:
+        rows[i].append(value)
+    counts = np.zeros(n + 1, dtype=np.int64)
+    for i, values in rows.items():
+        counts[i + 1] = len(values)
+    offsets = np.cumsum(counts)
+    values = np.zeros((int(offsets[-1]), width), dtype=dtype)
+    for i, vs in rows.items():
+        values[offsets[i]:offsets[i+1]] = vs
+    return offsets, values
+
+
+class FeatureTable:
+
+    def __init__(self, addrs: np.ndarray, columns: Dict[str, np.ndarray]):
+        self.addrs = addrs
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def __repr__(self):
+        return 'FeatureTable<Addrs {:,d}>'.format(len(self.addrs))
+
+    def __getattr__(self, name):
+        columns = self.__dict__.get('columns')
+        if columns is not None and name in columns:
+            return columns[name]
+        raise AttributeError(name)
+
+    def __contains__(self, addr):
+        return self.row(addr) >= 0
+
+    @classmethod
+    def build(cls, info: CandidateInfo, valid: Dict[str, int] = None):
+        addrset = set(info.tripaddrs()) | info.alladdrs() | info.twos | info.fours | info.ixpaddrs()
+        addrset.update(a for r in info.rttls for a in r[:3] if a is not None)
+        addrset.update(info.dst_asns.addrs)
+        addrs = np.array(sorted(a for a in addrset if a is not None), dtype=str)
+        table = cls(addrs, {})
+        index = {a: i for i, a in enumerate(addrs.tolist())}
+        n = len(addrs)
+        flags = np.zeros(n, dtype=np.uint32)
+        for name, flag in FLAGS.items():
+            ids = [index[a] for a in getattr(info, name)]
+            flags[ids] |= flag
+        flags[[index[a] for a in info.ixpaddrs()]] |= IXP
+        flags[[index[a] for a in info.cyaddrs()]] |= CYCLE
+        vcol = np.zeros(n, dtype=np.int8)
+        if valid is not None:
+            for a, v in valid.items():
+                i = index.get(a)
+                if i is not None:
+                    vcol[i] = v
+        missing = -1
+        trip_offsets, trips = csr(n, ((index[x], (index.get(w, missing), index.get(y, missing))) for w, x, y in info.triplets), 2)
+        dst = info.dst_asns
+        order = np.argsort(np.array([index[a] for a in dst.addrs], dtype=np.int64)[dst.addr_ids], kind='stable')
+        dasn_counts = np.zeros(n + 1, dtype=np.int64)
+        dasn_counts[1:][[index[a] for a in dst.addrs]] = np.diff(dst.offsets)
+        dasn_offsets = np.cumsum(dasn_counts)
+        dasns = dst.asns[order][:, None]
+        rttl_offsets, rttls = csr(n, ((index[x], (index.get(w, missing), index.get(y, missing), wt or 0, xt or 0, yt or 0)) for w, x, y, wt, xt, yt in info.rttls), 5)
+        table.columns = {
+            'flags': flags, 'valid': vcol,
+            'trip_offsets': trip_offsets, 'trip_w': trips[:, 0], 'trip_y': trips[:, 1],
+            'dasn_offsets': dasn_offsets, 'dasns': dasns[:, 0],
+            'rttl_offsets': rttl_offsets, 'rttl_w': rttls[:, 0], 'rttl_y': rttls[:, 1], 'rttl_ttls': rttls[:, 2:].astype(np.uint8)
+        }
+        return table
+
+    def dump(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'addrs.npy'), self.addrs)
+        for name, column in self.columns.items():
+            np.save(os.path.join(directory, '{}.npy'.format(name)), np.ascontiguousarray(column))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mode = 'r' if mmap else None
+        addrs = np.load(os.path.join(directory, 'addrs.npy'), mmap_mode=mode)
+        columns = {name: np.load(os.path.join(directory, '{}.npy'.format(name)), mmap_mode=mode) for name in COLUMNS}
+        return cls(addrs, columns)
+
+    def row(self, addr) -> int:
+        # The address column is sorted, so lookups binary search it instead of building a dict over a memory-mapped table
+        i = int(np.searchsorted(self.addrs, addr))
+        if i < len(self.addrs) and self.addrs[i] == addr:
+            return i
+        return -1
+
+    def lookup(self, addrs: Iterable[str]) -> np.ndarray:
+        addrs = np.asarray(list(addrs), dtype=self.addrs.dtype)
+        if not len(self.addrs):
+            return np.full(len(addrs), -1, dtype=np.int64)
+        pos = np.searchsorted(self.addrs, addrs)
+        pos[pos == len(self.addrs)] = 0
+        found = self.addrs[pos] == addrs
+        return np.where(found, pos, -1)
+
+    def select(self, mask: np.ndarray) -> Set[str]:
+        return set(self.addrs[np.flatnonzero(mask)].tolist())
+
+    def has(self, flag: int) -> np.ndarray:
+        return (self.flags & flag) != 0
+
+    def addrset(self, flag: int) -> Set[str]:
+        return self.select(self.has(flag))
+
+    def category(self, addr) -> str:
+        return self.category_row(self.row(addr))
+
+    def category_row(self, i) -> str:
+        if i < 0:
+            return 'invalid'
+        f = int(self.flags[i])
+        if f & TWO:
+            return 'twos'
+        if f & FOUR:
+            return 'fours'
+        if f & IXP:
+            return 'ixp'
+        return 'invalid'
+
+    def rows(self, i, offsets, *columns):
+        start, end = int(offsets[i]), int(offsets[i+1])
+        return [column[start:end] for column in columns]
+
+    def addr_or_none(self, i):
+        return str(self.addrs[i]) if i >= 0 else None
+
+    def trippairs(self, addr) -> List[Tuple[str, str]]:
+        return self.trippairs_row(self.row(addr))
+
+    def trippairs_row(self, i) -> List[Tuple[str, str]]:
+        if i < 0:
+            return []
+        ws, ys = self.rows(i, self.trip_offsets, self.trip_w, self.trip_y)
+        return [(self.addr_or_none(w), self.addr_or_none(y)) for w, y in zip(ws.tolist(), ys.tolist())]
+
+    def destasns(self, addr) -> Set[int]:
+        i = self.row(addr)
+        if i < 0:
+            return set()
+        return set(self.rows(i, self.dasn_offsets, self.dasns)[0].tolist())
+
+    def rttls(self, addr) -> List[Tuple]:
+        i = self.row(addr)
+        if i < 0:
+            return []
+        ws, ys, ttls = self.rows(i, self.rttl_offsets, self.rttl_w, self.rttl_y, self.rttl_ttls)
+        return [(self.addr_or_none(w), addr, self.addr_or_none(y), *t) for w, y, t in zip(ws.tolist(), ys.tolist(), ttls.tolist())]
+
+    def frame(self) -> pd.DataFrame:
+        flags = np.asarray(self.flags)
+        d = {'addr': self.addrs, 'valid': np.asarray(self.valid)}
+        for name, flag in list(FLAGS.items()) + [('ixp', IXP), ('cycle', CYCLE)]:
+            d[name] = (flags & flag) != 0
+        d['trips'] = np.diff(self.trip_offsets)
+        d['dasns'] = np.diff(self.dasn_offsets)
+        return pd.DataFrame(d)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-c', '--candidates', required=True)
+    parser.add_argument('-v', '--valid', help='Pickled ping test results from PingTest.test_candidates.')
+    parser.add_argument('-o', '--output', required=True, help='Directory for the feature table.')
+    args = parser.parse_args()
+    info = CandidateInfo.load(args.candidates)
+    valid = None
+    if args.valid:
+        with open(args.valid, 'rb') as f:
+            valid = pickle.load(f)
+    table = FeatureTable.build(info, valid=valid)
+    print(table)
+    table.dump(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,18 +7,27 @@ from random import sample
 from socket import AF_INET6
 from typing import List, Union, Optional, NamedTuple
 
+import numpy as np
 from traceutils.file2.file2 import File2
 from traceutils.progress.bar import Progress
 from traceutils.radix.ip2as import IP2AS, create_table
 from traceutils.scamper.hop import Hop, ICMPType
-from traceutils.scamper.warts import WartsReader
 from traceutils.utils.net import inet_fix
 
 from candidate_info import CandidateInfo
+from hopview import HopView
+from readers import open_reader
+from targets import write_targets
+from traceindex import TraceIndex, add_record
 
 _ip2as: Optional[IP2AS] = None
 middle_only = False
 include_dsts = None
+ftype = 'auto'
+use_hopview = False
+
+# Traces per HopView in candidates
+CHUNKSIZE = 4096
 
 class FakeHop:
     addr = None
@@ -36,7 +45,7 @@ def add_pair(info: CandidateInfo, ptype: int, w: Union[Hop, FakeHop], x: Hop, y:
     cfas.add(x.addr)
     info.rttls.add((w.addr, x.addr, y.addr, w.reply_ttl, x.reply_ttl, y.reply_ttl))
     info.triplets.add((w.addr, x.addr, y.addr))
-    info.dst_asns.add((x.addr, _ip2as[dst]))
+    info.dst_asns.add(x.addr, _ip2as[dst])
     if not end or y.type == ICMPType.echo_reply:
         echo_cfas.add(x.addr)
     if y.type == ICMPType.dest_unreach:
@@ -55,6 +64,8 @@ def same_prefix(x: str, y: str, prefixlen):
     return xprefix == yprefix
 
 def select_w(trace, i, xaddr):
+    if i == 0:
+        return FakeHop()
     w: Hop = trace.hops[i - 1]
     if w.addr == xaddr:
         for j in range(i - 2, -2, -1):
@@ -85,26 +96,152 @@ class WartsFile:
     def __repr__(self):
         return 'Warts<{}, {}>'.format(self.filename, self.monitor)
 
-def candidates_parallel(filenames: List[WartsFile], ip2as=None, poolsize=35):
+def candidates_parallel(filenames: List[WartsFile], ip2as=None, poolsize=35, index: TraceIndex = None):
     global _ip2as
     if ip2as is not None:
         _ip2as = ip2as
     info = CandidateInfo()
     files = [wf.filename for wf in filenames]
+    func = candidates if index is None else candidates_indexed
     pb = Progress(len(filenames), message='', callback=info.__str__)
     with Pool(poolsize) as pool:
-        for wf, newinfo in pb.iterator(zip(filenames, pool.imap(candidates, files))):
+        for wf, newinfo in pb.iterator(zip(filenames, pool.imap(func, files))):
+            if index is not None:
+                newinfo, records = newinfo
+                index.update(wf.filename, records)
             info.update(newinfo)
     return info
 
-def candidates(filename: str, ip2as=None, info: CandidateInfo = None):
+def candidates_indexed(filename: str):
+    records = {}
+    info = candidates(filename, records=records)
+    return info, records
+
+def add_trace(info: CandidateInfo, trace, record=None, records: dict = None):
+    packed = [hop.set_packed() for hop in trace.hops]
+    for i in range(len(packed) - (1 if not middle_only else 2)):
+        b1 = packed[i]
+        b2 = packed[i+1]
+        if b1 == b2:
+            continue
+        x = trace.hops[i]
+        y = trace.hops[i+1]
+        w: Union[Hop, FakeHop] = select_w(trace, i, x.addr)
+        if x.probe_ttl == y.probe_ttl - 1:
+            xasn = _ip2as.asn_packed(b1)
+            # if xasn > -100:
+            if xasn >= 0:
+                if are_adjacent(b1, b2):
+                    size = valid_pair(b1, b2)
+                    add_pair(info, size, w, x, y, i+2 == len(packed), trace.dst)
+                    if records is not None and size != 0:
+                        add_record(records, x.addr, y.addr, record)
+            elif xasn <= -100 and xasn == _ip2as.asn_packed(b2):
+                wasn = _ip2as.asn_packed(packed[i-1]) if i > 0 else None
+                info.ixps.add((wasn, x.addr, y.addr))
+                info.triplets.add((w.addr, x.addr, y.addr))
+                if records is not None:
+                    add_record(records, x.addr, y.addr, record)
+            if y.type == ICMPType.echo_reply:
+                info.nextecho.add(x.addr)
+            else:
+                info.nexthop.add(x.addr)
+        else:
+            if y.type == ICMPType.echo_reply:
+                info.multiecho.add(x.addr)
+            else:
+                info.multi.add(x.addr)
+    if not middle_only:
+        x = trace.hops[-1]
+        if x.type == ICMPType.echo_reply:
+            info.echos.add(x.addr)
+        else:
+            info.last.add(x.addr)
+
+def add_pairs(info: CandidateInfo, view: HopView, xs: np.ndarray, sizes: np.ndarray):
+    # add_pair for every candidate x of a HopView at once, sizes are the valid_pair results for each x
+    ys = xs + 1
+    tids = view.tid[xs]
+    wids = view.wids[xs]
+    ytypes = view.types(ys)
+    end = ys == view.ends[tids]
+    traces = view.traces
+    utids, inverse = np.unique(tids, return_inverse=True)
+    dasns = np.fromiter((_ip2as[traces[t].dst] for t in utids.tolist()), dtype=np.int64, count=len(utids))[inverse.ravel()]
+    waddrs = view.optional_addrs(wids)
+    xaddrs = view.addrs(xs)
+    yaddrs = view.addrs(ys)
+    rttl = view.hoparr['reply_ttl']
+    info.rttls.update(zip(waddrs, xaddrs, yaddrs, view.reply_ttls(wids), rttl[xs].tolist(), rttl[ys].tolist()))
+    info.triplets.update(zip(waddrs, xaddrs, yaddrs))
+    info.dst_asns.extend(xaddrs, dasns)
+    echo = ~end | (ytypes == int(ICMPType.echo_reply))
+    sizes = np.abs(sizes)
+    for size, cfas, echo_cfas in [(2, info.twos, info.echotwos), (4, info.fours, info.echofours)]:
+        found = sizes == size
+        cfas.update(view.unique_addrs(xs[found]))
+        echo_cfas.update(view.unique_addrs(xs[found & echo]))
+    unreach = ytypes == int(ICMPType.dest_unreach)
+    spoofing = ytypes == int(ICMPType.spoofing)
+    info.unreach.update(view.unique_addrs(xs[unreach]))
+    info.spoofing.update(view.unique_addrs(xs[spoofing]))
+    info.nounreach.update(view.unique_addrs(xs[~unreach & ~spoofing]))
+
+def add_traces(info: CandidateInfo, view: HopView, recnums: List[int] = None, records: dict = None):
+    # Same extraction as add_trace, but the pair tests run over the hop arrays of a whole chunk of traces
+    echo_reply = int(ICMPType.echo_reply)
+    hops = view.hops
+    packed = view.packed
+    asn_packed = _ip2as.asn_packed
+    xs = view.pairs(middle_only)
+    consec = view.consecutive(xs)
+    multi = xs[~consec]
+    echo = view.types(multi + 1) == echo_reply
+    info.multiecho.update(view.unique_addrs(multi[echo]))
+    info.multi.update(view.unique_addrs(multi[~echo]))
+    xs = xs[consec]
+    echo = view.types(xs + 1) == echo_reply
+    info.nextecho.update(view.unique_addrs(xs[echo]))
+    info.nexthop.update(view.unique_addrs(xs[~echo]))
+    xasns = view.lookup(xs, asn_packed)
+    cands = xs[(xasns >= 0) & view.adjacent(xs)]
+    sizes = view.pair_sizes(cands)
+    valid = sizes != 0
+    cands = cands[valid]
+    add_pairs(info, view, cands, sizes[valid])
+    if records is not None:
+        for i, t in zip(cands.tolist(), view.tid[cands].tolist()):
+            add_record(records, hops[i].addr, hops[i+1].addr, recnums[t])
+    ixps = xasns <= -100
+    cands = xs[ixps]
+    starts = view.starts
+    for i, t, wi, xasn in zip(cands.tolist(), view.tid[cands].tolist(), view.wids[cands].tolist(), xasns[ixps].tolist()):
+        if xasn == asn_packed(packed(i+1)):
+            x = hops[i]
+            y = hops[i+1]
+            wasn = asn_packed(packed(i-1)) if i > starts[t] else None
+            info.ixps.add((wasn, x.addr, y.addr))
+            info.triplets.add((hops[wi].addr if wi >= 0 else None, x.addr, y.addr))
+            if records is not None:
+                add_record(records, x.addr, y.addr, recnums[t])
+    if not middle_only:
+        lasts = view.ends
+        echo = view.types(lasts) == echo_reply
+        info.echos.update(view.unique_addrs(lasts[echo]))
+        info.last.update(view.unique_addrs(lasts[~echo]))
+
+def candidates(filename: str, ip2as=None, info: CandidateInfo = None, records: dict = None, vectorized=None, chunksize=CHUNKSIZE):
     global _ip2as
     if ip2as is not None:
         _ip2as = ip2as
+    if vectorized is None:
+        vectorized = use_hopview
     if info is None:
         info = CandidateInfo()
-    with WartsReader(filename) as f:
-        for trace in f:
+    chunk = []
+    recnums = []
+    with open_reader(filename, ftype) as f:
+        for record, trace in enumerate(f):
             if include_dsts is not None and trace.dst not in include_dsts:
                 continue
             # info.dsts.add(trace.dst)
@@ -114,41 +251,17 @@ def candidates(filename: str, ip2as=None, info: CandidateInfo = None):
                     trace.prune_loops()
                     if trace.loop:
                         info.cycles.add(tuple(h.addr for h in trace.loop))
-                    packed = [hop.set_packed() for hop in trace.hops]
-                    for i in range(len(packed) - (1 if not middle_only else 2)):
-                        b1 = packed[i]
-                        b2 = packed[i+1]
-                        if b1 == b2:
-                            continue
-                        x = trace.hops[i]
-                        y = trace.hops[i+1]
-                        w: Union[Hop, FakeHop] = select_w(trace, i, x.addr)
-                        if x.probe_ttl == y.probe_ttl - 1:
-                            xasn = _ip2as.asn_packed(b1)
-                            # if xasn > -100:
-                            if xasn >= 0:
-                                if are_adjacent(b1, b2):
-                                    size = valid_pair(b1, b2)
-                                    add_pair(info, size, w, x, y, i+2 == len(packed), trace.dst)
-                            elif xasn <= -100 and xasn == _ip2as.asn_packed(b2):
-                                wasn = _ip2as.asn_packed(packed[i-1]) if i > 0 else None
-                                info.ixps.add((wasn, x.addr, y.addr))
-                                info.triplets.add((w.addr, x.addr, y.addr))
-                            if y.type == ICMPType.echo_reply:
-                                info.nextecho.add(x.addr)
-                            else:
-                                info.nexthop.add(x.addr)
-                        else:
-                            if y.type == ICMPType.echo_reply:
-                                info.multiecho.add(x.addr)
-                            else:
-                                info.multi.add(x.addr)
-                    if not middle_only:
-                        x = trace.hops[-1]
-                        if x.type == ICMPType.echo_reply:
-                            info.echos.add(x.addr)
-                        else:
-                            info.last.add(x.addr)
+                    if not vectorized:
+                        add_trace(info, trace, record, records)
+                        continue
+                    chunk.append(trace)
+                    recnums.append(record)
+                    if len(chunk) == chunksize:
+                        add_traces(info, HopView(chunk), recnums, records)
+                        chunk = []
+                        recnums = []
+    if chunk:
+        add_traces(info, HopView(chunk), recnums, records)
     return info
 
 _addrs = None
@@ -156,25 +269,19 @@ _directory = None
 
 def write_addrs_vp(vp, directory=None, addrs=None):
     global _addrs, _directory
-    if directory is not None:
+    if directory is None:
         directory = _directory
-    if addrs is not None:
+    if addrs is None:
         addrs = _addrs
     shuffled = sample(addrs, len(addrs))
     with open(os.path.join(directory, '{}.addrs'.format(vp)), 'w') as f:
         f.writelines('{}\n'.format(a) for a in shuffled)
 
-def write_addrs(addrs, directory, vps):
-    global _addrs, _directory
-    _addrs = addrs
-    _directory = directory
-    os.makedirs(directory, exist_ok=True)
-    pb = Progress(len(vps), 'Writing')
-    for vp in pb.iterator(vps):
-        write_addrs_vp(vp, directory, addrs)
+def write_addrs(addrs, directory, vps, seed=0, compress=None, poolsize=20):
+    return write_targets(addrs, directory, vps, seed=seed, compress=compress, poolsize=poolsize)
 
 def main():
-    global middle_only, include_dsts
+    global middle_only, include_dsts, ftype, use_hopview
     parser = ArgumentParser()
     parser.add_argument('-f', '--filename', required=True)
     parser.add_argument('-o', '--output', required=True)
@@ -182,8 +289,13 @@ def main():
     parser.add_argument('-p', '--poolsize', type=int, default=40)
     parser.add_argument('-m', '--middle-only', action='store_true')
     parser.add_argument('-d', '--include-dsts')
+    parser.add_argument('-x', '--index', help='Write an index from candidate address pairs to trace records.')
+    parser.add_argument('-t', '--ftype', choices=['auto', 'warts', 'wartsjson', 'atlas'], default='auto', help='Trace file format, auto uses the file extension.')
+    parser.add_argument('-v', '--vectorized', action='store_true', help='Run the pair tests over HopView chunks instead of trace by trace.')
     args = parser.parse_args()
     middle_only = args.middle_only
+    ftype = args.ftype
+    use_hopview = args.vectorized
     if args.include_dsts:
         with File2(args.include_dsts) as f:
             include_dsts = {line.strip() for line in f}
@@ -196,11 +308,14 @@ def main():
             files.append(wf)
     print('Files: {:,d}'.format(len(files)))
     ip2as = create_table(args.ip2as)
-    info = candidates_parallel(files, ip2as=ip2as, poolsize=args.poolsize)
+    index = TraceIndex() if args.index else None
+    info = candidates_parallel(files, ip2as=ip2as, poolsize=args.poolsize, index=index)
     directory = os.path.dirname(args.output)
     if directory:
         os.makedirs(directory, exist_ok=True)
     info.dump(args.output, prune=True)
+    if index is not None:
+        index.dump(args.index)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,154 @@
+from itertools import repeat
+from operator import attrgetter
+from socket import AF_INET, AF_INET6, inet_pton
+from typing import List
+
+import numpy as np
+from traceutils.scamper.hop import Hop, Trace
+
+
+HOP_DTYPE = np.dtype([('addr', np.uint8, (16,)), ('size', np.uint8), ('probe_ttl', np.uint8), ('reply_ttl', np.uint8), ('type', np.uint8)])
+
+# finder.valid_pair as a lookup on the last two bits of x and y
+PAIR_SIZES = np.array([[0, 2, 0, 0], [-2, 4, 4, 4], [2, -4, 2, 2], [0, 0, -2, 0]], dtype=np.int8)
+
+
+class HopView:
+
+    def __init__(self, traces: List[Trace]):
+        self.traces = traces
+        self.hops: List[Hop] = [h for t in traces for h in t.hops]
+        lengths = np.fromiter((len(t.hops) for t in traces), dtype=np.int64, count=len(traces))
+        self.offsets = np.zeros(len(traces) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.tid = np.repeat(np.arange(len(traces)), lengths)
+        self.hoparr = self.create_array()
+        self._eqprev = None
+        self._wids = None
+        self._uids = None
+        self._firsts = None
+
+    def __len__(self):
+        return len(self.hops)
+
+    def __repr__(self):
+        return 'HopView<Traces {:,d} Hops {:,d}>'.format(len(self.traces), len(self.hops))
+
+    def create_array(self):
+        # Addresses are packed per family into one buffer and right aligned in 16 bytes, so the last byte and the /31 prefix sit in the same columns for both families
+        hops = self.hops
+        n = len(hops)
+        hoparr = np.zeros(n, dtype=HOP_DTYPE)
+        v6 = np.fromiter(map(attrgetter('family'), hops), dtype=np.int32, count=n) == AF_INET6
+        hoparr['size'] = np.where(v6, 16, 4)
+        addrs = list(map(attrgetter('addr'), hops))
+        for family, size, found in [(AF_INET, 4, ~v6), (AF_INET6, 16, v6)]:
+            found = np.flatnonzero(found)
+            if not len(found):
+                continue
+            faddrs = addrs if len(found) == n else [addrs[i] for i in found.tolist()]
+            buf = b''.join(map(inet_pton, repeat(family, len(found)), faddrs))
+            hoparr['addr'][found, 16 - size:] = np.frombuffer(buf, dtype=np.uint8).reshape(-1, size)
+        for field in ['probe_ttl', 'reply_ttl', 'type']:
+            hoparr[field] = np.fromiter(map(attrgetter(field), hops), dtype=np.uint8, count=n)
+        return hoparr
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self.offsets[:-1]
+
+    @property
+    def ends(self) -> np.ndarray:
+        return self.offsets[1:] - 1
+
+    @property
+    def eqprev(self) -> np.ndarray:
+        # True where a hop has the same address as the previous hop in its trace
+        if self._eqprev is None:
+            addr = self.hoparr['addr']
+            size = self.hoparr['size']
+            eq = np.zeros(len(self.hops), dtype=bool)
+            eq[1:] = (addr[1:] == addr[:-1]).all(1) & (size[1:] == size[:-1])
+            eq[self.starts] = False
+            self._eqprev = eq
+        return self._eqprev
+
+    @property
+    def wids(self) -> np.ndarray:
+        # finder.select_w for every hop: the hop before the run of hops repeating its address, -1 when none exists
+        if self._wids is None:
+            pos = np.arange(len(self.hops))
+            runstart = np.maximum.accumulate(np.where(self.eqprev, 0, pos))
+            wids = runstart - 1
+            wids[runstart == self.starts[self.tid]] = -1
+            self._wids = wids
+        return self._wids
+
+    @property
+    def uids(self) -> np.ndarray:
+        # Routers repeat across the traces in a chunk, so per-address work like ASN lookups runs once per unique address
+        if self._uids is None:
+            raw = np.empty((len(self.hops), 17), dtype=np.uint8)
+            raw[:, :16] = self.hoparr['addr']
+            raw[:, 16] = self.hoparr['size']
+            _, self._firsts, uids = np.unique(raw.view('V17').ravel(), return_index=True, return_inverse=True)
+            self._uids = uids.ravel()
+        return self._uids
+
+    def packed(self, i) -> bytes:
+        size = self.hoparr['size'][i]
+        return self.hoparr['addr'][i, 16 - size:].tobytes()
+
+    def lookup(self, idx: np.ndarray, func, dtype=np.int64) -> np.ndarray:
+        uids = self.uids
+        needed, inverse = np.unique(uids[idx], return_inverse=True)
+        packed = self.packed
+        firsts = self._firsts
+        values = np.fromiter((func(packed(firsts[u])) for u in needed.tolist()), dtype=dtype, count=len(needed))
+        return values[inverse.ravel()]
+
+    def pairs(self, middle_only=False) -> np.ndarray:
+        # Indices of x for each (x, x+1) pair the finder loop visits, skipping repeated addresses
+        n = len(self.hops)
+        limit = self.offsets[1:] - (2 if middle_only else 1)
+        pos = np.arange(n)
+        keep = pos < limit[self.tid]
+        keep[:-1] &= ~self.eqprev[1:]
+        return np.flatnonzero(keep)
+
+    def consecutive(self, xs: np.ndarray) -> np.ndarray:
+        probe_ttl = self.hoparr['probe_ttl'].astype(np.int16)
+        return probe_ttl[xs] + 1 == probe_ttl[xs + 1]
+
+    def adjacent(self, xs: np.ndarray) -> np.ndarray:
+        addr = self.hoparr['addr']
+        size = self.hoparr['size']
+        ys = xs + 1
+        last = addr[:, 15].astype(np.int16)
+        return (addr[xs, :15] == addr[ys, :15]).all(1) & (size[xs] == size[ys]) & (np.abs(last[xs] - last[ys]) == 1)
+
+    def pair_sizes(self, xs: np.ndarray) -> np.ndarray:
+        last = self.hoparr['addr'][:, 15]
+        return PAIR_SIZES[last[xs] % 4, last[xs + 1] % 4]
+
+    def types(self, idx: np.ndarray) -> np.ndarray:
+        return self.hoparr['type'][idx]
+
+    def addrs(self, idx: np.ndarray) -> List[str]:
+        hops = self.hops
+        return [hops[i].addr for i in idx.tolist()]
+
+    def unique_addrs(self, idx: np.ndarray) -> List[str]:
+        # For set updates, where repeated addresses would only be discarded
+        if not len(idx):
+            return []
+        uids = np.unique(self.uids[idx])
+        return self.addrs(self._firsts[uids])
+
+    def optional_addrs(self, idx: np.ndarray) -> List[str]:
+        hops = self.hops
+        return [hops[i].addr if i >= 0 else None for i in idx.tolist()]
+
+    def reply_ttls(self, idx: np.ndarray) -> List[int]:
+        ttls = self.hoparr['reply_ttl'][idx].tolist()
+        return [ttl if i >= 0 else None for i, ttl in zip(idx.tolist(), ttls)]
@@ -1,55 +1,206 @@
 #!/usr/bin/env python
+import os
+import re
 from argparse import ArgumentParser
-from typing import TextIO
+from collections import defaultdict
+from multiprocessing.pool import Pool
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
+
+
+TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|/\*|\*/|[{};\[\]]|[^\s{};\[\]"]+')
+
+
+class ConfigNode:
+    __slots__ = ['words', 'children']
+
+    def __init__(self, words: Tuple, children: List['ConfigNode'] = None):
+        self.words = words
+        self.children = children
+
+    def __repr__(self):
+        return 'ConfigNode<{}{}>'.format(' '.join(map(str, self.words)), ' {...}' if self.children is not None else ';')
+
+    @property
+    def key(self):
+        return self.words[0] if self.words else None
+
+    @property
+    def inactive(self):
+        return bool(self.words) and self.words[0] == 'inactive:'
+
+    def find(self, *keys: str) -> Iterator['ConfigNode']:
+        n = len(keys)
+        for child in self.children or ():
+            words = child.words[1:] if child.inactive else child.words
+            if words[:n] == keys:
+                yield child
+
+    def values(self, key: str) -> List:
+        return [child.words[1] for child in self.find(key) if len(child.words) > 1]
+
+    def to_dict(self):
+        d = defaultdict(list)
+        for child in self.children or ():
+            d[child.key].append(child.to_dict() if child.children is not None else child.words[1:])
+        return dict(d)
+
+
+def tokenize(lines: Iterable[str]) -> Iterator[str]:
+    comment = False
+    for line in lines:
+        stripped = line.lstrip()
+        if not stripped or stripped[0] == '<' or (stripped[0] == '#' and not comment):
+            continue
+        for tok in TOKEN.findall(stripped):
+            if comment:
+                if tok.endswith('*/'):
+                    comment = False
+            elif tok == '/*':
+                comment = True
+            elif tok[0] == '#':
+                break
+            else:
+                yield tok
+
+
+def unquote(tok: str):
+    if len(tok) >= 2 and tok[0] == '"' and tok[-1] == '"':
+        return tok[1:-1]
+    return tok
+
+
+def parse_tokens(tokens: Iterable[str]) -> ConfigNode:
+    root = ConfigNode((), [])
+    stack = [root]
+    words = []
+    inlist = None
+    for tok in tokens:
+        if inlist is not None:
+            if tok == ']':
+                words.append(tuple(inlist))
+                inlist = None
+            else:
+                inlist.append(unquote(tok))
+        elif tok == '[':
+            inlist = []
+        elif tok == ';':
+            if words:
+                stack[-1].children.append(ConfigNode(tuple(words)))
+                words = []
+        elif tok == '{':
+            node = ConfigNode(tuple(words), [])
+            stack[-1].children.append(node)
+            stack.append(node)
+            words = []
+        elif tok == '}':
+            if words:
+                stack[-1].children.append(ConfigNode(tuple(words)))
+                words = []
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            words.append(unquote(tok))
+    return root
 
 
 class Parser:
     def __init__(self, filename):
-        with open(filename) as f:
-            self._lines = f.readlines()
-        self.lines = iter(self._lines)
-
-    def parse(self):
-        d = {}
-        while True:
-            try:
-                line = next(self.lines)
-            except StopIteration:
-                break
-            if not line:
+        self.filename = filename
+
+    def parse(self) -> ConfigNode:
+        with File2(self.filename) as f:
+            return parse_tokens(tokenize(f))
+
+
+def interface_addrs(root: ConfigNode) -> Dict[str, Set[str]]:
+    addrs = defaultdict(set)
+    for interfaces in root.find('interfaces'):
+        for iface in interfaces.children or ():
+            if iface.inactive or not iface.words:
                 continue
-            line = line.strip()
-            if line[0] == '#' or line[0] == '<':
+            name = iface.words[0]
+            for unit in iface.find('unit'):
+                if len(unit.words) < 2:
+                    continue
+                ifname = '{}.{}'.format(name, unit.words[1])
+                for family in unit.find('family'):
+                    if len(family.words) > 1 and family.words[1] in ('inet', 'inet6'):
+                        for addr in family.values('address'):
+                            addrs[ifname].add(addr.partition('/')[0])
+    return dict(addrs)
+
+
+def vrf_interfaces(root: ConfigNode, types=('vrf',)) -> Dict[str, Set[str]]:
+    vrfs = {}
+    for instances in root.find('routing-instances'):
+        for instance in instances.children or ():
+            if instance.inactive or not instance.words:
                 continue
-            if line == '}':
-                break
-            if '[' in line:
-                key, _, value = line.partition('[')
-                key = key.strip()
-                value = value[:-2]
-                value = value.split()
-            else:
-                key, _, value = line.rpartition(' ')
-            if value == '{':
-                d[key] = self.parse()
-            elif key:
-                if isinstance(value, str):
-                    value = value[:-1]
-                if key in d:
-                    d[key] = [d[key], value]
-                else:
-                    d[key] = value
-            else:
-                d[value] = True
-        return d
+            if any(t in types for t in instance.values('instance-type')):
+                ifaces = {i if '.' in i else '{}.0'.format(i) for i in instance.values('interface')}
+                vrfs[instance.words[0]] = ifaces
+    return vrfs
 
 
-if __name__ == '__main__':
+def vrf_addrs(root: ConfigNode) -> Tuple[Set[str], Set[str]]:
+    addrs = interface_addrs(root)
+    vrfifaces = {i for ifaces in vrf_interfaces(root).values() for i in ifaces}
+    vpn = set()
+    default = set()
+    for ifname, ifaddrs in addrs.items():
+        if ifname in vrfifaces:
+            vpn.update(ifaddrs)
+        else:
+            default.update(ifaddrs)
+    return vpn, default
+
+
+def config_addrs(filename):
+    root = Parser(filename).parse()
+    return vrf_addrs(root)
+
+
+def parse_directory(directory, poolsize=20) -> Tuple[Set[str], Set[str]]:
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if not f.startswith('.'))
+    vpn = set()
+    default = set()
+    pb = Progress(len(files), 'Parsing configs', callback=lambda: 'VPN {:,d} Default {:,d}'.format(len(vpn), len(default)))
+    with Pool(max(1, min(poolsize, len(files)))) as pool:
+        for newvpn, newdefault in pb.iterator(pool.imap_unordered(config_addrs, files)):
+            vpn.update(newvpn)
+            default.update(newdefault)
+    default -= vpn
+    return vpn, default
+
+
+def write_addrs(filename, addrs):
+    with File2(filename, 'wt') as f:
+        f.writelines('{}\n'.format(a) for a in sorted(addrs))
+
+
+def main():
     parser = ArgumentParser()
-    parser.add_argument('file')
+    parser.add_argument('file', help='Config file, or a directory of config files.')
+    parser.add_argument('-v', '--vpn', help='Write VRF interface addresses here.')
+    parser.add_argument('-d', '--default', help='Write non-VRF interface addresses here.')
+    parser.add_argument('-p', '--poolsize', type=int, default=20)
     args = parser.parse_args()
+    if os.path.isdir(args.file):
+        vpn, default = parse_directory(args.file, poolsize=args.poolsize)
+    elif args.vpn or args.default:
+        vpn, default = config_addrs(args.file)
+    else:
+        print(Parser(args.file).parse().to_dict())
+        return
+    print('VPN {:,d} Default {:,d}'.format(len(vpn), len(default)))
+    if args.vpn:
+        write_addrs(args.vpn, vpn)
+    if args.default:
+        write_addrs(args.default, default)
 
-    with open(args.file) as f:
-        parser = Parser(args.file)
-        output = parser.parse()
-    print(output)
+
+if __name__ == '__main__':
+    main()
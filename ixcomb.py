@@ -1,5 +1,7 @@
 import json
 
+from ixprefixes import IXPPrefixes
+
 
 class IXComb:
     def __init__(self, filename):
@@ -12,3 +14,6 @@ class IXComb:
                     for prefixes in j['prefixes'].values():
                         for prefix in prefixes:
                             self.prefixes[prefix] = j['ix_id']
+
+    def create_prefixes(self):
+        return IXPPrefixes(self.prefixes)
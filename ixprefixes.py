@@ -0,0 +1,165 @@
+from socket import inet_pton, AF_INET, AF_INET6
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+
+def prefix_range(prefix: str) -> Tuple[int, int, int]:
+    net, _, prefixlen = prefix.partition('/')
+    if ':' in net:
+        # IPv6 intervals only keep the upper 64 bits, enough for IXP LANs
+        value = int.from_bytes(inet_pton(AF_INET6, net)[:8], 'big')
+        bits = 64
+        prefixlen = min(int(prefixlen), 64) if prefixlen else 64
+    else:
+        value = int.from_bytes(inet_pton(AF_INET, net), 'big')
+        bits = 32
+        prefixlen = int(prefixlen) if prefixlen else 32
+    size = 1 << (bits - prefixlen)
+    start = value & ~(size - 1)
+    return start, start + size - 1, 6 if bits == 64 else 4
+
+
+def addr_value(addr: str) -> int:
+    if ':' in addr:
+        return int.from_bytes(inet_pton(AF_INET6, addr)[:8], 'big')
+    return int.from_bytes(inet_pton(AF_INET, addr), 'big')
+
+
+def flatten(intervals: List[Tuple[int, int, int]]):
+    intervals.sort(key=lambda t: (t[0], -t[1]))
+    out = []
+
+    def emit(start, end, ixid):
+        if start > end:
+            return
+        if out and out[-1][2] == ixid and out[-1][1] + 1 == start:
+            out[-1] = (out[-1][0], end, ixid)
+        else:
+            out.append((start, end, ixid))
+
+    stack = []
+    cur = 0
+    for start, end, ixid in intervals:
+        while stack and stack[-1][0] < start:
+            pend, pid = stack.pop()
+            emit(cur, pend, pid)
+            cur = pend + 1
+        if stack:
+            emit(cur, start - 1, stack[-1][1])
+        stack.append((end, ixid))
+        cur = start
+    while stack:
+        pend, pid = stack.pop()
+        emit(cur, pend, pid)
+        cur = pend + 1
+    return out
+
+
+class IntervalTable:
+
+    def __init__(self, intervals: List[Tuple[int, int, int]]):
+        flat = flatten(intervals)
+        self.starts = np.array([t[0] for t in flat], dtype=np.uint64)
+        self.ends = np.array([t[1] for t in flat], dtype=np.uint64)
+        self.ixids = np.array([t[2] for t in flat], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def lookup(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.uint64)
+        if not len(self.starts):
+            return np.zeros(len(values), dtype=np.int64)
+        idx = np.searchsorted(self.starts, values, side='right') - 1
+        valid = idx >= 0
+        idx[~valid] = 0
+        valid &= values <= self.ends[idx]
+        return np.where(valid, self.ixids[idx], 0)
+
+    @classmethod
+    def from_arrays(cls, starts, ends, ixids):
+        table = cls([])
+        table.starts = starts
+        table.ends = ends
+        table.ixids = ixids
+        return table
+
+
+class IXPPrefixes:
+
+    def __init__(self, prefixes: Dict[str, int]):
+        v4, v6 = [], []
+        for prefix, ixid in prefixes.items():
+            prefix = prefix.strip()
+            if not prefix:
+                continue
+            try:
+                start, end, family = prefix_range(prefix)
+            except (OSError, ValueError):
+                continue
+            (v4 if family == 4 else v6).append((start, end, int(ixid)))
+        self.v4 = IntervalTable(v4)
+        self.v6 = IntervalTable(v6)
+
+    def __repr__(self):
+        return 'IPv4 {:,d} IPv6 {:,d}'.format(len(self.v4), len(self.v6))
+
+    def __getitem__(self, addr: str) -> int:
+        return int(self.lookup([addr])[0])
+
+    def __contains__(self, addr: str):
+        return self[addr] != 0
+
+    @classmethod
+    def from_peeringdb(cls, peeringdb):
+        return cls(peeringdb.prefixes)
+
+    @classmethod
+    def merge(cls, *sources: Dict[str, int]):
+        prefixes = {}
+        for source in sources:
+            for prefix, ixid in source.items():
+                prefixes.setdefault(prefix, ixid)
+        return cls(prefixes)
+
+    def lookup(self, addrs: Iterable[str]) -> np.ndarray:
+        addrs = list(addrs)
+        ixids = np.zeros(len(addrs), dtype=np.int64)
+        v4idx, v4vals, v6idx, v6vals = [], [], [], []
+        for i, addr in enumerate(addrs):
+            try:
+                value = addr_value(addr)
+            except (OSError, TypeError):
+                continue
+            if ':' in addr:
+                v6idx.append(i)
+                v6vals.append(value)
+            else:
+                v4idx.append(i)
+                v4vals.append(value)
+        if v4idx:
+            ixids[v4idx] = self.v4.lookup(np.array(v4vals, dtype=np.uint64))
+        if v6idx:
+            ixids[v6idx] = self.v6.lookup(np.array(v6vals, dtype=np.uint64))
+        return ixids
+
+    def filter(self, addrs: Iterable[str]):
+        addrs = list(addrs)
+        ixids = self.lookup(addrs)
+        return {addr for addr, ixid in zip(addrs, ixids.tolist()) if ixid}
+
+    def dump(self, filename):
+        with open(filename, 'wb') as f:
+            np.savez_compressed(
+                f, starts4=self.v4.starts, ends4=self.v4.ends, ixids4=self.v4.ixids,
+                starts6=self.v6.starts, ends6=self.v6.ends, ixids6=self.v6.ixids
+            )
+
+    @classmethod
+    def load(cls, filename):
+        ixps = cls({})
+        with np.load(filename) as d:
+            ixps.v4 = IntervalTable.from_arrays(d['starts4'], d['ends4'], d['ixids4'])
+            ixps.v6 = IntervalTable.from_arrays(d['starts6'], d['ends6'], d['ixids6'])
+        return ixps
@@ -1,15 +1,24 @@
 import pickle
+import zlib
 from collections import defaultdict
 from multiprocessing.pool import Pool
-from typing import List, Set
+from socket import inet_pton, AF_INET, AF_INET6
+from typing import List, Set, Optional
 
+import numpy as np
 from traceutils.as2org.as2org import AS2Org
 from traceutils.bgp.bgp import BGP
 from traceutils.progress.bar import Progress
 from traceutils.radix.ip2as import IP2AS
 from traceutils.scamper.hop import ICMPType
 from traceutils.scamper.warts import WartsReader
-from traceutils.utils.net import otherside
+
+from orgs import OrgMap
+
+
+_prune: Optional['Prune'] = None
+_cache = {}
+_nshards = 16
 
 
 class LastCand:
@@ -28,15 +37,55 @@ class LastCand:
         self.dasns.update(info.dasns)
 
 
+def shard(addr: str, nshards: int):
+    return zlib.crc32(addr.encode()) % nshards
+
+
+class LastAggregate:
+
+    def __init__(self, nshards=16):
+        self.nshards = nshards
+        self.middle = [set() for _ in range(nshards)]
+        self.pasns = [defaultdict(set) for _ in range(nshards)]
+        self.dasns = [defaultdict(set) for _ in range(nshards)]
+
+    def __repr__(self):
+        mlen = sum(len(m) for m in self.middle)
+        plen = sum(len(p) for p in self.pasns)
+        dlen = sum(len(d) for d in self.dasns)
+        return 'M {:,d} P {:,d} D {:,d}'.format(mlen, plen, dlen)
+
+    def update(self, shards: List[LastCand]):
+        for i, info in enumerate(shards):
+            self.middle[i].update(info.middle)
+            pasns = self.pasns[i]
+            for addr, pasn in info.pasns:
+                pasns[addr].add(pasn)
+            dasns = self.dasns[i]
+            for addr, dasn in info.dasns:
+                dasns[addr].add(dasn)
+
+    def finalize(self):
+        pasns = defaultdict(set)
+        dasns = defaultdict(set)
+        for middle, spasns, sdasns in zip(self.middle, self.pasns, self.dasns):
+            pasns.update((addr, asns) for addr, asns in spasns.items() if addr not in middle)
+            dasns.update((addr, asns) for addr, asns in sdasns.items() if addr not in middle)
+        return pasns, dasns
+
+
 class Prune:
 
     def __init__(self, ip2as: IP2AS, as2org: AS2Org, bgp: BGP, *infos: List[LastCand]):
         self.ip2as = ip2as
         self.as2org = as2org
+        self.orgmap = OrgMap.create(as2org)
         self.bgp = bgp
         self.pasns = defaultdict(set)
         self.dasns = defaultdict(set)
         self.toprobe = None
+        self.asnindex = None
+        self.covers = None
         if infos:
             pb = Progress(len(infos), 'Merging infos', callback=self.__repr__)
             for info in pb.iterator(infos):
@@ -59,6 +108,9 @@ class Prune:
             self.pasns = d['pasns']
             self.dasns = d['dasns']
 
+    def aggregate(self, agg: LastAggregate):
+        self.pasns, self.dasns = agg.finalize()
+
     def simplify(self, info):
         for addr, pasn in info.pasns:
             if addr not in info.middle:
@@ -70,12 +122,62 @@ class Prune:
     def dasn_filter(self, dasns):
         if len(dasns) <= 1:
             return True
+        orgs = {asn: self.orgmap[asn] for asn in dasns}
         for x in dasns:
-            xorg = self.as2org[x]
-            if all(y == x or self.bgp.provider_rel(x, y) or xorg == self.as2org[y] for y in dasns):
+            xorg = orgs[x]
+            if all(y == x or xorg == orgs[y] or self.bgp.provider_rel(x, y) for y in dasns):
                 return True
         return False
 
+    def provider_bitmap(self, asns):
+        self.asnindex = {asn: i for i, asn in enumerate(sorted(asns))}
+        orgbits = defaultdict(int)
+        for asn, i in self.asnindex.items():
+            orgbits[self.orgmap[asn]] |= 1 << i
+        self.covers = {}
+        for asn, i in self.asnindex.items():
+            bits = orgbits[self.orgmap[asn]]
+            for customer in self.bgp.customers[asn]:
+                j = self.asnindex.get(customer)
+                if j is not None:
+                    bits |= 1 << j
+            self.covers[asn] = bits
+
+    def dasn_filter_bitmap(self, dasns, cache=None):
+        if len(dasns) <= 1:
+            return True
+        if cache is not None:
+            key = frozenset(dasns)
+            result = cache.get(key)
+            if result is not None:
+                return result
+        mask = 0
+        for asn in dasns:
+            mask |= 1 << self.asnindex[asn]
+        result = any(self.covers[asn] & mask == mask for asn in dasns)
+        if cache is not None:
+            cache[key] = result
+        return result
+
+    def probe_addr(self, addr, pasns, dasns, cache=None):
+        if self.dasn_filter_bitmap(dasns, cache=cache):
+            asn = self.ip2as[addr]
+            return asn not in dasns or asn not in pasns
+        return False
+
+    def remove_same_parallel(self, poolsize=40, chunksize=10000):
+        global _prune
+        asns = {asn for dasns in self.dasns.values() for asn in dasns}
+        self.provider_bitmap(asns)
+        addrs = list(self.pasns)
+        chunks = [addrs[i:i+chunksize] for i in range(0, len(addrs), chunksize)]
+        self.toprobe = set()
+        _prune = self
+        pb = Progress(len(chunks), 'Filtering', callback=lambda: '{:,d}'.format(len(self.toprobe)))
+        with Pool(poolsize) as pool:
+            for toprobe in pb.iterator(pool.imap_unordered(remove_same_chunk, chunks)):
+                self.toprobe.update(toprobe)
+
     def remove_same(self):
         self.toprobe = set()
         pb = Progress(len(self.pasns), 'Filtering', increment=100000, callback=lambda: '{:,d}'.format(len(self.toprobe)))
@@ -90,6 +192,16 @@ class Prune:
                     self.toprobe.add(addr)
 
 
+def remove_same_chunk(addrs):
+    toprobe = []
+    empty = set()
+    for addr in addrs:
+        dasns = _prune.dasns.get(addr, empty)
+        if _prune.probe_addr(addr, _prune.pasns[addr], dasns, cache=_cache):
+            toprobe.append(addr)
+    return toprobe
+
+
 class WartsFile:
     def __init__(self, filename, monitor):
         self.filename = filename
@@ -106,12 +218,40 @@ def candidates_parallel(filenames: List[WartsFile], ip2as=None, poolsize=40):
     infos = defaultdict(LastCand)
     files = [wf.filename for wf in filenames]
     pb = Progress(len(filenames), message='Reading last info')
-    with Pool(min(poolsize, len(filenames))) as pool:
+    with Pool(max(1, min(poolsize, len(filenames)))) as pool:
         for wf, newinfo in pb.iterator(zip(filenames, pool.imap(candidates, files))):
             infos[wf.monitor].update(newinfo)
     return infos
 
 
+def candidates_stream(filenames: List[WartsFile], ip2as=None, poolsize=40, nshards=16):
+    global _ip2as, _nshards
+    if ip2as is not None:
+        _ip2as = ip2as
+    _nshards = nshards
+    agg = LastAggregate(nshards)
+    files = [wf.filename for wf in filenames]
+    pb = Progress(len(files), message='Reading last info', callback=agg.__repr__)
+    with Pool(max(1, min(poolsize, len(files)))) as pool:
+        for shards in pb.iterator(pool.imap_unordered(candidates_shards, files)):
+            agg.update(shards)
+    return agg
+
+
+def candidates_shards(filename: str):
+    info = candidates(filename)
+    shards = [LastCand() for _ in range(_nshards)]
+    for addr in info.middle:
+        shards[shard(addr, _nshards)].middle.add(addr)
+    for addr, pasn in info.pasns:
+        if addr not in info.middle:
+            shards[shard(addr, _nshards)].pasns.add((addr, pasn))
+    for addr, dasn in info.dasns:
+        if addr not in info.middle:
+            shards[shard(addr, _nshards)].dasns.add((addr, dasn))
+    return shards
+
+
 def candidates(filename: str, ip2as=None, info: LastCand = None):
     global _ip2as
     if ip2as is not None:
@@ -165,36 +305,169 @@ def read_pings(filenames: List[WartsFile], poolsize=40):
     return responses
 
 
+def read_responses_vp(args):
+    monitor, filename = args
+    return monitor, read_responses(filename)
+
+
+def split_addr(addr: str):
+    packed = inet_pton(AF_INET6 if ':' in addr else AF_INET, addr)
+    return packed[:-1] + bytes([packed[-1] & 0xFE]), packed[-1] & 1
+
+
+class PingMatrix:
+
+    def __init__(self, vps: List[str]):
+        self.vps = sorted(set(vps))
+        self.vpids = {vp: i for i, vp in enumerate(self.vps)}
+        self.words = max(1, (len(self.vps) + 63) // 64)
+        self.addrs = []
+        self.ids = {}
+        self.prefixes = {}
+        self._prefix = np.zeros(1024, dtype=np.int64)
+        self._low = np.zeros(1024, dtype=np.uint8)
+        self._phases = np.zeros(1024, dtype=np.uint8)
+        self._bits = np.zeros((1024, self.words), dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def __repr__(self):
+        return 'Addrs {:,d} VPs {:,d}'.format(len(self.addrs), len(self.vps))
+
+    def grow(self):
+        n = len(self._prefix)
+        self._prefix = np.concatenate([self._prefix, np.zeros(n, dtype=np.int64)])
+        self._low = np.concatenate([self._low, np.zeros(n, dtype=np.uint8)])
+        self._phases = np.concatenate([self._phases, np.zeros(n, dtype=np.uint8)])
+        self._bits = np.concatenate([self._bits, np.zeros((n, self.words), dtype=np.uint64)])
+
+    def vpid(self, vp: str) -> int:
+        i = self.vpids.get(vp)
+        if i is None:
+            i = len(self.vps)
+            self.vps.append(vp)
+            self.vpids[vp] = i
+            if i // 64 == self.words:
+                self._bits = np.concatenate([self._bits, np.zeros((len(self._bits), 1), dtype=np.uint64)], axis=1)
+                self.words += 1
+        return i
+
+    def intern(self, addr: str) -> int:
+        i = self.ids.get(addr)
+        if i is None:
+            i = len(self.addrs)
+            if i == len(self._prefix):
+                self.grow()
+            self.ids[addr] = i
+            self.addrs.append(addr)
+            prefix, low = split_addr(addr)
+            self._prefix[i] = self.prefixes.setdefault(prefix, len(self.prefixes))
+            self._low[i] = low
+        return i
+
+    def interns(self, addrs) -> np.ndarray:
+        return np.fromiter((self.intern(a) for a in addrs), dtype=np.int64, count=len(addrs))
+
+    @property
+    def prefix(self):
+        return self._prefix[:len(self.addrs)]
+
+    @property
+    def low(self):
+        return self._low[:len(self.addrs)]
+
+    @property
+    def phases(self):
+        return self._phases[:len(self.addrs)]
+
+    @property
+    def bits(self):
+        return self._bits[:len(self.addrs)]
+
+    def add(self, vp: str, addrs, phase: int):
+        if not addrs:
+            return
+        ids = self.interns(list(addrs))
+        vpid = self.vpid(vp)
+        self._bits[ids, vpid // 64] |= np.uint64(1 << (vpid % 64))
+        self._phases[ids] |= phase
+
+    def responded(self, phase=0xFF) -> np.ndarray:
+        return np.flatnonzero(self.phases & phase)
+
+    def select(self, ids: np.ndarray) -> Set[str]:
+        return {self.addrs[i] for i in ids.tolist()}
+
+    def otherside_responded(self, ids: np.ndarray, phase) -> np.ndarray:
+        # Each /31 keeps a two bit mask of which of its addresses answered, so the otherside test is a shift and an and
+        pairs = np.zeros(len(self.prefixes), dtype=np.uint8)
+        resp = self.responded(phase)
+        np.bitwise_or.at(pairs, self.prefix[resp], (1 << self.low[resp]).astype(np.uint8))
+        return (pairs[self.prefix[ids]] >> (1 - self.low[ids])) & 1 == 1
+
+    def vp_ids(self, vp: str) -> np.ndarray:
+        vpid = self.vpids[vp]
+        return np.flatnonzero(self.bits[:, vpid // 64] & np.uint64(1 << (vpid % 64)))
+
+    def vp_addrs(self, vp: str) -> Set[str]:
+        return self.select(self.vp_ids(vp))
+
+    def seen(self, addr: str) -> Set[str]:
+        i = self.ids.get(addr)
+        if i is None:
+            return set()
+        row = self.bits[i]
+        return {vp for vp, vpid in self.vpids.items() if int(row[vpid // 64]) >> (vpid % 64) & 1}
+
+
 class LastPings:
 
-    def __init__(self, toprobe: Set[str]):
+    PHASE2 = 1
+    PHASE4 = 2
+
+    def __init__(self, toprobe: Set[str], vps: List[str] = None):
         self.toprobe2 = toprobe
-        self.addrs2 = None
-        self.resps2 = None
         self.toprobe4 = None
-        self.addrs4 = None
-        self.resps4 = None
-        self.addrs = None
-        self.resps = None
+        self.matrix = PingMatrix(vps) if vps is not None else None
+
+    def __repr__(self):
+        return 'LastPings<{}>'.format(self.matrix)
+
+    def read(self, filenames: List[WartsFile], phase, poolsize=40):
+        if self.matrix is None:
+            self.matrix = PingMatrix([wf.monitor for wf in filenames])
+        jobs = [(wf.monitor, wf.filename) for wf in filenames]
+        pb = Progress(len(jobs), 'Reading pings', callback=self.matrix.__repr__)
+        with Pool(max(1, min(poolsize, len(jobs)))) as pool:
+            for monitor, responses in pb.iterator(pool.imap_unordered(read_responses_vp, jobs)):
+                self.matrix.add(monitor, responses, phase)
 
     def subnet2(self, filenames, poolsize=40):
-        self.addrs2 = set()
-        self.resps2 = read_pings(filenames, poolsize=poolsize)
-        for resps in self.resps2.values():
-            self.addrs2.update(resps)
-        self.toprobe4 = self.toprobe2 - {otherside(a, 2) for a in self.addrs2}
+        self.read(filenames, self.PHASE2, poolsize=poolsize)
+        toprobe = list(self.toprobe2)
+        ids = self.matrix.interns(toprobe)
+        found = self.matrix.otherside_responded(ids, self.PHASE2)
+        self.toprobe4 = {a for a, f in zip(toprobe, found.tolist()) if not f}
 
     def subnet4(self, filenames, poolsize=40):
-        self.addrs4 = set()
-        self.resps4 = read_pings(filenames, poolsize=poolsize)
-        for resps in self.resps4.values():
-            self.addrs4.update(resps)
+        self.read(filenames, self.PHASE4, poolsize=poolsize)
+
+    @property
+    def addrs2(self):
+        return self.matrix.select(self.matrix.responded(self.PHASE2))
+
+    @property
+    def addrs4(self):
+        return self.matrix.select(self.matrix.responded(self.PHASE4))
+
+    @property
+    def addrs(self):
+        return self.matrix.select(self.matrix.responded())
+
+    @property
+    def resps(self):
+        return {vp: self.matrix.vp_addrs(vp) for vp in self.matrix.vps}
 
     def trace_probe(self):
-        self.addrs = self.addrs2 | self.addrs4
-        self.resps = {}
-        vps = self.resps2.keys() | self.resps4.keys()
-        for vp in vps:
-            addrs2 = self.resps2.get(vp, set())
-            addrs4 = self.resps4.get(vp, set())
-            self.resps[vp] = addrs2 | addrs4
+        return self.resps
@@ -0,0 +1,91 @@
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+from traceutils.as2org.as2org import AS2Org
+from traceutils.ixps.ixps import PeeringDB
+
+
+# ASNs without an AS2Org entry are their own org, like AS2Org's str(asn) fallback
+MISSING_BASE = -(1 << 40)
+
+
+class OrgMap:
+
+    def __init__(self, as2org: AS2Org, asns: Iterable[int] = None):
+        if asns is None:
+            asns = as2org.orgs.keys()
+        self.orgids: Dict[str, int] = {}
+        self.table: Dict[int, int] = {}
+        for asn in asns:
+            org = as2org[asn]
+            orgid = self.orgids.get(org)
+            if orgid is None:
+                orgid = len(self.orgids)
+                self.orgids[org] = orgid
+            self.table[asn] = orgid
+        self.asns = np.array(sorted(self.table), dtype=np.int64)
+        self.orgs = np.array([self.table[asn] for asn in self.asns.tolist()], dtype=np.int64)
+
+    def __getitem__(self, asn: int) -> int:
+        orgid = self.table.get(asn)
+        if orgid is None:
+            return MISSING_BASE - asn
+        return orgid
+
+    def __len__(self):
+        return len(self.table)
+
+    def __repr__(self):
+        return 'ASNs {:,d} Orgs {:,d}'.format(len(self.table), len(self.orgids))
+
+    @classmethod
+    def create(cls, as2org: Union[AS2Org, 'OrgMap']) -> 'OrgMap':
+        if isinstance(as2org, OrgMap):
+            return as2org
+        return cls(as2org)
+
+    def lookup(self, asns) -> np.ndarray:
+        asns = np.asarray(asns, dtype=np.int64)
+        if not len(self.asns):
+            return MISSING_BASE - asns
+        idx = np.searchsorted(self.asns, asns)
+        idx[idx == len(self.asns)] = 0
+        found = self.asns[idx] == asns
+        return np.where(found, self.orgs[idx], MISSING_BASE - asns)
+
+    def orgset(self, asns: Iterable[Optional[int]]):
+        return {self[asn] for asn in asns if asn is not None}
+
+
+class PeeringOrgs:
+
+    def __init__(self, addrs: Dict[str, int], orgmap: OrgMap):
+        self.orgmap = orgmap
+        self.addrs: Dict[str, Tuple[int, int]] = {addr: (asn, orgmap[asn]) for addr, asn in addrs.items()}
+
+    def __contains__(self, addr):
+        return addr in self.addrs
+
+    def __getitem__(self, addr) -> Tuple[int, int]:
+        return self.addrs[addr]
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def __repr__(self):
+        return 'Addrs {:,d}'.format(len(self.addrs))
+
+    @classmethod
+    def create(cls, peeringdb: Union[PeeringDB, Dict[str, int], 'PeeringOrgs'], as2org: Union[AS2Org, OrgMap]) -> 'PeeringOrgs':
+        if isinstance(peeringdb, PeeringOrgs):
+            return peeringdb
+        addrs = peeringdb if isinstance(peeringdb, dict) else peeringdb.addrs
+        return cls(addrs, OrgMap.create(as2org))
+
+    def asn(self, addr, default=0) -> int:
+        t = self.addrs.get(addr)
+        return default if t is None else t[0]
+
+    def org(self, addr, default=0) -> int:
+        t = self.addrs.get(addr)
+        return self.orgmap[default] if t is None else t[1]
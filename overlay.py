@@ -0,0 +1,104 @@
+from collections.abc import MutableSet
+from typing import Iterable, Set
+
+
+class OverlaySet(MutableSet):
+
+    def __init__(self, base: Set = None, removed: Set = None, added: Set = None):
+        self.base = base if base is not None else set()
+        self.removed = removed if removed is not None else set()
+        self.added = added if added is not None else set()
+
+    def __contains__(self, x):
+        return (x in self.base and x not in self.removed) or x in self.added
+
+    def __iter__(self):
+        if self.removed:
+            removed = self.removed
+            for x in self.base:
+                if x not in removed:
+                    yield x
+        else:
+            yield from self.base
+        yield from self.added
+
+    def __len__(self):
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def __repr__(self):
+        return 'OverlaySet<{:,d} -{:,d} +{:,d}>'.format(len(self.base), len(self.removed), len(self.added))
+
+    def __reduce__(self):
+        return set, (list(self),)
+
+    def add(self, x):
+        if x in self.base:
+            self.removed.discard(x)
+        else:
+            self.added.add(x)
+
+    def discard(self, x):
+        if x in self.added:
+            self.added.discard(x)
+        elif x in self.base:
+            self.removed.add(x)
+
+    def clear(self):
+        self.removed = set(self.base)
+        self.added = set()
+
+    def copy(self):
+        return OverlaySet(self.base, set(self.removed), set(self.added))
+
+    def materialize(self) -> set:
+        s = self.base - self.removed if self.removed else set(self.base)
+        s.update(self.added)
+        return s
+
+    def update(self, *others: Iterable):
+        for other in others:
+            for x in other:
+                self.add(x)
+
+    def __or__(self, other):
+        s = self.materialize()
+        s.update(other)
+        return s
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        if len(other) < len(self):
+            return {x for x in other if x in self}
+        return {x for x in self if x in other}
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        s = self.materialize()
+        s.difference_update(other)
+        return s
+
+    def __rsub__(self, other):
+        return {x for x in other if x not in self}
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        if other is self:
+            self.clear()
+            return self
+        if not isinstance(other, (set, frozenset, OverlaySet)):
+            other = set(other)
+        self.removed.update(self.base.intersection(other))
+        self.added.difference_update(other)
+        return self
+
+
+def snapshot(s):
+    # Overlay bases are only ever read, but a plain set may still be changed in place by its owner
+    if isinstance(s, OverlaySet):
+        return s.copy()
+    return set(s)
@@ -1,41 +1,118 @@
 #!/usr/bin/env python
 from argparse import ArgumentParser
-from itertools import islice
+from multiprocessing.pool import Pool
+from socket import inet_pton, inet_ntop, AF_INET, AF_INET6
+from typing import Iterator, List, Optional, Set
 
-import netaddr
 from lxml import etree
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
 from traceutils.radix.ip2as import IP2AS
 
 
-def print_addrs(filename):
-    ip2as = IP2AS()
-    ip2as.add_private()
-    parser = etree.XMLParser(ns_clean=True, recover=True)
-    root = etree.parse(filename, parser)
-    ifads = root.findall('.//{*}ifa-destination')
+_ip2as: Optional[IP2AS] = None
+
+
+def private_trie():
+    global _ip2as
+    if _ip2as is None:
+        _ip2as = IP2AS()
+        _ip2as.add_private()
+    return _ip2as
+
+
+def ifa_destinations(filename) -> Iterator[str]:
+    context = etree.iterparse(filename, events=('end',), recover=True, huge_tree=True, remove_comments=True)
+    for _, elem in context:
+        tag = elem.tag
+        if isinstance(tag, str) and tag.rpartition('}')[2] == 'ifa-destination':
+            text = elem.text
+            if text:
+                yield text.strip()
+        # Elements are only needed until their end event, so free them and any processed siblings
+        elem.clear()
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+    del context
+
+
+def net_hosts(net: str, count=2) -> List[str]:
+    addr, _, prefixlen = net.partition('/')
+    if ':' in addr:
+        family, bits = AF_INET6, 128
+    else:
+        family, bits = AF_INET, 32
+    try:
+        value = int.from_bytes(inet_pton(family, addr), 'big')
+        prefixlen = int(prefixlen)
+    except (OSError, ValueError):
+        return []
+    if not 0 <= prefixlen <= bits:
+        return []
+    size = 1 << (bits - prefixlen)
+    first = value & ~(size - 1)
+    # Matches netaddr's iter_hosts, which skips the network address when there are at least 4 addresses
+    if size >= 4:
+        first += 1
+    nbytes = bits // 8
+    return [inet_ntop(family, (first + i).to_bytes(nbytes, 'big')) for i in range(min(count, size))]
+
+
+def file_addrs(filename, minlen=16) -> List[str]:
+    ip2as = private_trie()
     seen = set()
-    for ifad in ifads:
-        if ifad is not None:
-            net = ifad.text
-            _, _, prefixlen = net.partition('/')
-            if prefixlen:
-                prefixlen = int(prefixlen)
-                if prefixlen > 16:
-                    node = ip2as.search_best_prefix(net)
-                    if node and node.asn < 0:
-                        continue
-                    if net in seen:
-                        continue
-                    seen.add(net)
-                    for host in islice(netaddr.IPNetwork(net).iter_hosts(), 2):
-                        print('"{}"'.format(str(host)))
+    addrs = []
+    for net in ifa_destinations(filename):
+        _, _, prefixlen = net.partition('/')
+        if not prefixlen.isdigit() or int(prefixlen) <= minlen:
+            continue
+        if net in seen:
+            continue
+        seen.add(net)
+        node = ip2as.search_best_prefix(net)
+        if node and node.asn < 0:
+            continue
+        addrs.extend(net_hosts(net))
+    return addrs
+
+
+def print_addrs(filename):
+    for host in file_addrs(filename):
+        print('"{}"'.format(host))
+
+
+def parse_files(filenames, poolsize=20) -> Set[str]:
+    addrs = set()
+    pb = Progress(len(filenames), 'Parsing XML', callback=lambda: '{:,d}'.format(len(addrs)))
+    with Pool(max(1, min(poolsize, len(filenames)))) as pool:
+        for newaddrs in pb.iterator(pool.imap_unordered(file_addrs, filenames)):
+            addrs.update(newaddrs)
+    return addrs
+
+
+def write_addrs(filename, addrs):
+    with File2(filename, 'wt') as f:
+        f.writelines('{}\n'.format(a) for a in sorted(addrs))
 
 
 def main():
     parser = ArgumentParser()
-    parser.add_argument('filename')
+    parser.add_argument('filenames', nargs='+')
+    parser.add_argument('-o', '--output', help='Write the deduplicated addresses here instead of printing them.')
+    parser.add_argument('-p', '--poolsize', type=int, default=20)
     args = parser.parse_args()
-    print_addrs(args.filename)
+    if args.output is None and len(args.filenames) == 1:
+        print_addrs(args.filenames[0])
+        return
+    addrs = parse_files(args.filenames, poolsize=args.poolsize)
+    if args.output is None:
+        for host in sorted(addrs):
+            print('"{}"'.format(host))
+    else:
+        print('Addrs {:,d}'.format(len(addrs)))
+        write_addrs(args.output, addrs)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,61 @@
+import hashlib
 import os
+import pickle
+from multiprocessing.pool import Pool
 
 from traceutils.file2.file2 import File2
 from traceutils.progress.bar import Progress
 from traceutils.radix.ip2as import IP2AS
 
+from ixprefixes import IXPPrefixes
+
+
+def read_nexthops(file):
+    addrs = {}
+    with File2(file, 'rb') as f:
+        for line in f:
+            if line[:1] != b'*':
+                continue
+            parts = line.split()
+            if len(parts) < 7 or b'/' not in parts[1]:
+                continue
+            try:
+                asn = int(parts[5])
+            except ValueError:
+                continue
+            if asn != 42 and asn != 715:
+                addr = parts[2].decode()
+                if addr not in addrs:
+                    addrs[addr] = asn
+    return addrs
+
+
+def cache_filename(file, cachedir):
+    st = os.stat(file)
+    key = '{}|{}|{}'.format(os.path.abspath(file), st.st_mtime_ns, st.st_size)
+    return os.path.join(cachedir, '{}.pickle'.format(hashlib.sha1(key.encode()).hexdigest()))
+
+
+def read_nexthops_cached(args):
+    file, cachedir = args
+    if cachedir is None:
+        return read_nexthops(file)
+    cachefile = cache_filename(file, cachedir)
+    if os.path.exists(cachefile):
+        with open(cachefile, 'rb') as f:
+            return pickle.load(f)
+    addrs = read_nexthops(file)
+    tmp = '{}.{}'.format(cachefile, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(addrs, f)
+    os.replace(tmp, cachefile)
+    return addrs
+
+
 class PCH:
-    def __init__(self, ip2as: IP2AS):
+    def __init__(self, ip2as: IP2AS = None, ixps: IXPPrefixes = None):
         self.ip2as = ip2as
+        self.ixps = ixps
 
     def read(self, file):
         addrs = {}
@@ -25,13 +74,19 @@ class PCH:
                     try:
                         asn = int(path[0])
                         if asn != 42 and asn != 715:
-                            if self.ip2as[addr] <= -100:
+                            if self.ixps is not None:
+                                if addr not in addrs:
+                                    addrs[addr] = asn
+                            elif self.ip2as[addr] <= -100:
                                 # addrs[addr] = (asn, os.path.basename(file))
                                 if addr not in addrs:
                                     addrs[addr] = asn
                     except:
                         print(line)
                         raise
+        if self.ixps is not None:
+            ixpaddrs = self.ixps.filter(addrs)
+            addrs = {addr: asn for addr, asn in addrs.items() if addr in ixpaddrs}
         return addrs
 
     def read_files(self, files, addrs=None):
@@ -42,3 +97,21 @@ class PCH:
             newaddrs = self.read(file)
             addrs.update(newaddrs)
         return addrs
+
+    def ixp_nexthops(self, nexthops):
+        if self.ixps is not None:
+            ixpaddrs = self.ixps.filter(nexthops)
+            return {addr: asn for addr, asn in nexthops.items() if addr in ixpaddrs}
+        return {addr: asn for addr, asn in nexthops.items() if self.ip2as[addr] <= -100}
+
+    def read_files_parallel(self, files, addrs=None, cachedir=None, poolsize=20):
+        if addrs is None:
+            addrs = {}
+        if cachedir is not None:
+            os.makedirs(cachedir, exist_ok=True)
+        jobs = [(file, cachedir) for file in files]
+        pb = Progress(len(files), 'pch', increment=1, callback=lambda: '{:,d}'.format(len(addrs)))
+        with Pool(max(1, min(poolsize, len(files)))) as pool:
+            for nexthops in pb.iterator(pool.imap(read_nexthops_cached, jobs)):
+                addrs.update(self.ixp_nexthops(nexthops))
+        return addrs
@@ -1,8 +1,117 @@
+import json
+import os
+import sys
+import time
 from multiprocessing.pool import ThreadPool
 
 import requests
+from requests.adapters import HTTPAdapter
 from traceutils.progress.bar import Progress
 from traceutils.radix.ip2as import IP2AS
+from urllib3.util.retry import Retry
+
+from ixprefixes import IXPPrefixes
+
+
+PCH_API = 'https://www.pch.net/api/ixp'
+
+
+class PCHCache:
+
+    def __init__(self, cachedir=None, base_url=PCH_API, offline=False, max_age=86400, poolsize=5, retries=3, timeout=30):
+        self.cachedir = cachedir
+        self.base_url = base_url.rstrip('/')
+        self.offline = offline
+        self.max_age = max_age
+        self.timeout = timeout
+        self.meta = {}
+        self.session = None
+        if offline and cachedir is None:
+            raise Exception('Offline mode requires a cache directory')
+        if cachedir is not None:
+            os.makedirs(os.path.join(cachedir, 'subnets'), exist_ok=True)
+            metafile = os.path.join(cachedir, 'meta.json')
+            if os.path.exists(metafile):
+                with open(metafile) as f:
+                    self.meta = json.load(f)
+        if not offline:
+            retry = Retry(total=retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=poolsize, max_retries=retry)
+            self.session = requests.Session()
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    def cache_filename(self, path):
+        if path == 'directory/active':
+            return os.path.join(self.cachedir, 'directory.json')
+        return os.path.join(self.cachedir, '{}.json'.format(path))
+
+    def dump_meta(self):
+        if self.cachedir is not None:
+            tmp = os.path.join(self.cachedir, 'meta.json.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(self.meta, f)
+            os.replace(tmp, os.path.join(self.cachedir, 'meta.json'))
+
+    def get(self, path):
+        if self.cachedir is None:
+            r = self.session.get('{}/{}'.format(self.base_url, path), timeout=self.timeout)
+            r.raise_for_status()
+            return r.json()
+        filename = self.cache_filename(path)
+        cached = os.path.exists(filename)
+        meta = self.meta.get(path, {})
+        if self.offline:
+            if not cached:
+                raise FileNotFoundError('{} is not cached in {}'.format(path, self.cachedir))
+        elif not cached or time.time() - meta.get('fetched', 0) > self.max_age:
+            try:
+                self.refresh(path, filename, meta, cached)
+            except requests.RequestException as e:
+                # A stale copy on disk is still usable, so only fail when there is nothing cached
+                if not cached:
+                    raise
+                print('Warning: refreshing {} failed, using the cached copy: {}'.format(path, e), file=sys.stderr)
+        with open(filename) as f:
+            return json.load(f)
+
+    def refresh(self, path, filename, meta, cached):
+        headers = {}
+        if cached:
+            if 'etag' in meta:
+                headers['If-None-Match'] = meta['etag']
+            if 'modified' in meta:
+                headers['If-Modified-Since'] = meta['modified']
+        r = self.session.get('{}/{}'.format(self.base_url, path), headers=headers, timeout=self.timeout)
+        if r.status_code != 304:
+            r.raise_for_status()
+            tmp = '{}.tmp'.format(filename)
+            with open(tmp, 'wb') as f:
+                f.write(r.content)
+            os.replace(tmp, filename)
+            meta = {}
+            if 'ETag' in r.headers:
+                meta['etag'] = r.headers['ETag']
+            if 'Last-Modified' in r.headers:
+                meta['modified'] = r.headers['Last-Modified']
+        meta['fetched'] = time.time()
+        self.meta[path] = meta
+
+    def directory(self):
+        directory = self.get('directory/active')
+        self.dump_meta()
+        return directory
+
+    def subnets(self, ixid):
+        subnets = []
+        try:
+            j = self.get('subnets/{}'.format(ixid))
+        except (requests.RequestException, FileNotFoundError):
+            return subnets, ixid
+        for info in j:
+            if 'subnet' in info:
+                subnets.append(info['subnet'])
+        return subnets, ixid
 
 
 def retrieve_subnet(ixid):
@@ -16,29 +125,24 @@ def retrieve_subnet(ixid):
 
 
 class PCH:
-    def __init__(self):
-        r = requests.get('https://www.pch.net/api/ixp/directory/active')
-        if not r.ok:
-            raise Exception('Should be ok')
-        self.directory = r.json()
+    def __init__(self, cachedir=None, offline=False, base_url=PCH_API, max_age=86400, poolsize=5):
+        self.cache = PCHCache(cachedir, base_url=base_url, offline=offline, max_age=max_age, poolsize=poolsize)
+        self.directory = self.cache.directory()
         self.ixids = {int(ix['id']) for ix in self.directory}
         self.subnets = {}
 
     def retrieve_subnets(self, poolsize=5):
         pb = Progress(len(self.ixids), 'Retrieving subnets', callback=lambda: '{:,d}'.format(len(self.subnets)))
         with ThreadPool(poolsize) as pool:
-            for subnets, ixid in pb.iterator(pool.imap_unordered(retrieve_subnet, self.ixids)):
+            for subnets, ixid in pb.iterator(pool.imap_unordered(self.cache.subnets, sorted(self.ixids))):
                 for subnet in subnets:
                     subnet = subnet.strip()
                     if subnet:
                         self.subnets[subnet] = ixid
+        self.cache.dump_meta()
 
     def retrieve_addrs(self, poolsize=5):
-        pb = Progress(len(self.ixids), 'Retrieving subnets', callback=lambda: '{:,d}'.format(len(self.subnets)))
-        with ThreadPool(poolsize) as pool:
-            for subnets, ixid in pb.iterator(pool.imap_unordered(retrieve_subnet, self.ixids)):
-                for subnet in subnets:
-                    self.subnets[subnet] = ixid
+        self.retrieve_subnets(poolsize=poolsize)
 
     def create_trie(self):
         ip2as = IP2AS()
@@ -46,3 +150,6 @@ class PCH:
             # print(type(ixid))
             ip2as.add(subnet, asn=ixid)
         return ip2as
+
+    def create_prefixes(self):
+        return IXPPrefixes(self.subnets)
@@ -3,13 +3,16 @@ from multiprocessing.pool import Pool
 
 from traceutils.progress.bar import Progress
 from traceutils.scamper.hop import ICMPType
-from traceutils.scamper.warts import WartsReader
+from traceutils.scamper.warts import WartsJsonReader, WartsReader
 from traceutils.utils.net import prefix_addrs
 
+from readers import file_type
+
 
 def read_responses(filename):
     responses = defaultdict(bool)
-    with WartsReader(filename) as f:
+    reader = WartsJsonReader if file_type(filename) == 'wartsjson' else WartsReader
+    with reader(filename) as f:
         for ping in f:
             resp = any(r.type == ICMPType.echo_reply for r in ping.responses)
             responses[ping.dst] |= resp
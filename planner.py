@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+import heapq
+import os
+import pickle
+from argparse import ArgumentParser
+from collections import defaultdict
+from multiprocessing.pool import Pool
+from typing import Dict, Iterable, List, Set
+
+import numpy as np
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
+
+from commands import arksync, command
+from targets import Targets, permutation, target_filename, vp_seed
+
+
+# Packets sent per target by the scamper commands in commands.command
+PACKETS = {'ping': 2, 'trace': 16}
+
+_plan: Dict[str, List[str]] = None
+
+
+class Planner:
+
+    def __init__(self, budgets: Dict[str, float], hours: float, ctype='ping', redundancy=1, packets=None):
+        self.vps = sorted(budgets)
+        self.budgets = budgets
+        self.hours = hours
+        self.ctype = ctype
+        self.redundancy = redundancy
+        self.packets = packets if packets is not None else PACKETS[ctype]
+        self.capacity = np.array([int(budgets[vp] * hours * 3600 / self.packets) for vp in self.vps], dtype=np.int64)
+        self.load = np.zeros(len(self.vps), dtype=np.int64)
+        self.plan: Dict[str, List[str]] = defaultdict(list)
+        self.unassigned: Set[str] = set()
+        self.underassigned: Set[str] = set()
+
+    def __repr__(self):
+        return 'Assigned {:,d} Unassigned {:,d} Underassigned {:,d} Hours {:.1f}'.format(int(self.load.sum()), len(self.unassigned), len(self.underassigned), self.duration())
+
+    def duration(self):
+        pps = np.array([self.budgets[vp] for vp in self.vps], dtype=float)
+        if not len(pps):
+            return 0.0
+        return float((self.load * self.packets / pps).max() / 3600)
+
+    def assign(self, addr, i):
+        self.plan[self.vps[i]].append(addr)
+        self.load[i] += 1
+
+    def assign_seen(self, targets: Iterable[str], seen: Dict[str, Set[str]]):
+        # Targets already reached by some VPs go to the least loaded of those VPs first
+        vpids = {vp: i for i, vp in enumerate(self.vps)}
+        rest = []
+        constrained = sorted((len(seen[a]), a) for a in targets if seen.get(a))
+        for _, addr in constrained:
+            choices = [(self.load[i] / self.capacity[i], i) for i in (vpids[vp] for vp in seen[addr] if vp in vpids) if self.load[i] < self.capacity[i]]
+            chosen = heapq.nsmallest(self.redundancy, choices)
+            for _, i in chosen:
+                self.assign(addr, i)
+            if len(chosen) < self.redundancy:
+                rest.append((addr, {i for _, i in chosen}))
+        return rest
+
+    def assign_any(self, addrs: List[str], seed=0):
+        # Spread targets over every VP in proportion to its remaining capacity, each target on distinct VPs
+        n = len(addrs)
+        if not n:
+            return []
+        k = min(self.redundancy, len(self.vps))
+        remaining = np.minimum(np.maximum(self.capacity - self.load, 0), n)
+        total = int(remaining.sum())
+        need = n * k
+        if total > need:
+            quota = np.floor(remaining * need / total).astype(np.int64)
+            short = need - int(quota.sum())
+            order = np.argsort(-(remaining * need / total - quota), kind='stable')
+            quota[order[:short]] += 1
+            quota = np.minimum(quota, remaining)
+        else:
+            quota = remaining
+        slots = np.repeat(np.arange(len(self.vps)), quota)
+        order = permutation(n, seed)
+        used = [set() for _ in range(n)]
+        for j in range(k):
+            block = slots[j * n:(j + 1) * n]
+            for t, i in zip(order[:len(block)].tolist(), block.tolist()):
+                self.assign(addrs[t], i)
+                used[t].add(i)
+        # Targets left short of the redundancy go to assign_rest with the VPs they already have
+        return [(addrs[t], used[t]) for t in range(n) if len(used[t]) < self.redundancy]
+
+    def assign_rest(self, rest):
+        heap = [(self.load[i] / self.capacity[i], i) for i in range(len(self.vps)) if self.load[i] < self.capacity[i]]
+        heapq.heapify(heap)
+        for addr, used in rest:
+            skipped = []
+            while len(used) < self.redundancy and heap:
+                ratio, i = heapq.heappop(heap)
+                if self.load[i] >= self.capacity[i]:
+                    continue
+                if i in used:
+                    skipped.append((ratio, i))
+                    continue
+                self.assign(addr, i)
+                used.add(i)
+                if self.load[i] < self.capacity[i]:
+                    skipped.append((self.load[i] / self.capacity[i], i))
+            for item in skipped:
+                heapq.heappush(heap, item)
+            if not used:
+                self.unassigned.add(addr)
+            elif len(used) < self.redundancy:
+                self.underassigned.add(addr)
+
+    def create(self, targets: Iterable[str], seen: Dict[str, Set[str]] = None, seed=0):
+        targets = sorted(set(targets))
+        rest = []
+        if seen:
+            rest = self.assign_seen(targets, seen)
+            free = [a for a in targets if not seen.get(a)]
+        else:
+            free = targets
+        rest.extend(self.assign_any(free, seed=seed))
+        self.assign_rest(rest)
+        return self.plan
+
+    def commands(self, directory, remote, outfile, bz2=True):
+        lines = [arksync(os.path.join(directory, '%MON.addrs'), remote, list(self.plan))]
+        groups = defaultdict(list)
+        for vp in self.plan:
+            groups[self.budgets[vp]].append(vp)
+        for pps, vps in sorted(groups.items()):
+            pps = int(pps) if float(pps).is_integer() else pps
+            lines.append(command(remote, outfile, self.ctype, bz2=bz2, vps=sorted(vps), pps=pps))
+        return lines
+
+
+def seen_by_addr(responses: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    seen = defaultdict(set)
+    for vp, addrs in responses.items():
+        for addr in addrs:
+            seen[addr].add(vp)
+    seen.default_factory = None
+    return seen
+
+
+def write_plan_vp(args):
+    vp, directory, seed = args
+    filename = target_filename(directory, vp)
+    return Targets(_plan[vp]).write(filename, vp_seed(vp, seed))
+
+
+def write_plan(plan: Dict[str, List[str]], directory, seed=0, poolsize=20):
+    global _plan
+    _plan = plan
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(vp, directory, seed) for vp in sorted(plan)]
+    filenames = []
+    pb = Progress(len(jobs), 'Writing')
+    with Pool(max(1, min(poolsize, len(jobs)))) as pool:
+        for filename in pb.iterator(pool.imap_unordered(write_plan_vp, jobs)):
+            filenames.append(filename)
+    return filenames
+
+
+def read_budgets(vps, pps):
+    budgets = {}
+    if os.path.exists(vps):
+        with File2(vps) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                vp, *rest = line.split()
+                budgets[vp] = float(rest[0]) if rest else pps
+    else:
+        for vp in vps.split(','):
+            if vp:
+                budgets[vp] = pps
+    return budgets
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-t', '--targets', nargs='+', required=True, help='Files with one target address per line.')
+    parser.add_argument('-v', '--vps', required=True, help='Comma separated VPs, or a file with a VP and optional pps per line.')
+    parser.add_argument('-r', '--pps', type=float, default=100, help='Default per-VP packets per second.')
+    parser.add_argument('-H', '--hours', type=float, default=6)
+    parser.add_argument('-c', '--ctype', choices=['ping', 'trace'], default='ping')
+    parser.add_argument('-k', '--redundancy', type=int, default=1, help='Number of VPs probing each target.')
+    parser.add_argument('-s', '--seen', help='Pickled VP to responsive addresses dict, e.g. LastPings.resps.')
+    parser.add_argument('-o', '--output-dir', required=True)
+    parser.add_argument('-n', '--name', default='plan', help='Remote file name prefix.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-p', '--poolsize', type=int, default=20)
+    args = parser.parse_args()
+    targets = set()
+    for filename in args.targets:
+        with File2(filename) as f:
+            targets.update(line.strip() for line in f if line.strip())
+    seen = None
+    if args.seen:
+        with open(args.seen, 'rb') as f:
+            seen = seen_by_addr(pickle.load(f))
+    budgets = read_budgets(args.vps, args.pps)
+    print('Targets: {:,d} VPs: {:,d}'.format(len(targets), len(budgets)))
+    planner = Planner(budgets, args.hours, ctype=args.ctype, redundancy=args.redundancy)
+    plan = planner.create(targets, seen=seen, seed=args.seed)
+    print(planner)
+    write_plan(plan, args.output_dir, seed=args.seed, poolsize=args.poolsize)
+    lines = planner.commands(args.output_dir, '{}.addrs'.format(args.name), '{}.{}.warts.bz2'.format(args.name, args.ctype))
+    with open(os.path.join(args.output_dir, 'commands.sh'), 'w') as f:
+        f.writelines('{}\n'.format(line) for line in lines)
+    if planner.unassigned:
+        with File2(os.path.join(args.output_dir, 'unassigned.addrs'), 'wt') as f:
+            f.writelines('{}\n'.format(a) for a in sorted(planner.unassigned))
+    if planner.underassigned:
+        with File2(os.path.join(args.output_dir, 'underassigned.addrs'), 'wt') as f:
+            f.writelines('{}\n'.format(a) for a in sorted(planner.underassigned))
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from traceutils.scamper.warts import WartsReader
 from traceutils.utils.net import prefix_addrs
 
 from candidate_info import CandidateInfo
+from orgs import PeeringOrgs
 
 
 def read_responses(filename):
@@ -29,6 +30,7 @@ class Prune:
         self.info = info
         self.as2org = as2org
         self.peeringdb = peeringdb
+        self.peeringorgs = PeeringOrgs.create(peeringdb, as2org)
         self.ixps = None
         self.responses = None
         self.reply_ttls = None
@@ -54,11 +56,9 @@ class Prune:
         pasns = self.info.ixpprev()
         pb = Progress(len(pasns), 'Pruning IXPs', increment=100000, callback=lambda: '{:,d}'.format(len(self.ixps)))
         for x, asns in pb.iterator(pasns.items()):
-            if x in self.peeringdb.addrs:
-                asn = self.peeringdb.addrs[x]
-                org = self.as2org[asn]
-                orgs = {self.as2org[asn] for asn in asns if asn is not None}
-                if org in orgs:
+            if x in self.peeringorgs:
+                _, org = self.peeringorgs[x]
+                if org in self.peeringorgs.orgmap.orgset(asns):
                     self.ixps.add(x)
             else:
                 pass
@@ -0,0 +1,137 @@
+import shutil
+from subprocess import Popen, PIPE
+from typing import Iterator, List, Optional
+
+import orjson
+from traceutils.file2.file2 import File2
+from traceutils.scamper.warts import WartsJsonReader, WartsReader, WartsTrace
+
+
+# Atlas err codes to (IPv4, IPv6) ICMP unreachable codes, same mapping as traceutils' AtlasHop
+ATLAS_ERRS = {'N': (0, 0), 'H': (1, 3), 'A': (13, 5), 'P': (2, 4), 'p': (3, 4)}
+
+
+def file_type(filename: str):
+    if '.warts.json' in filename:
+        return 'wartsjson'
+    if '.warts' in filename:
+        return 'warts'
+    return 'atlas'
+
+
+def decompressor():
+    for cmd in ['lbzip2', 'pbzip2']:
+        if shutil.which(cmd):
+            return cmd
+    return None
+
+
+def atlas_icmp(family: int, j: dict, dst: str, icmp: bool):
+    err = j.get('err')
+    if err:
+        if isinstance(err, int):
+            code = err
+        else:
+            code = ATLAS_ERRS.get(err, (0, 0))[0 if family == 4 else 1]
+        return (3 if family == 4 else 1), code
+    if j['from'] == dst:
+        if icmp:
+            return (0, 0) if family == 4 else (129, 0)
+        return (3, 3) if family == 4 else (1, 4)
+    return (11, 0) if family == 4 else (3, 0)
+
+
+def atlas_icmpext(icmpext) -> Optional[List[dict]]:
+    if not icmpext:
+        return None
+    for obj in icmpext.get('obj', ()):
+        if 'mpls' in obj:
+            return [{'mpls_labels': obj['mpls']}]
+    return [icmpext]
+
+
+def atlas_hops(j: dict) -> List[dict]:
+    family = j.get('af', 4)
+    dst = j.get('dst_addr')
+    icmp = j.get('proto') == 'ICMP'
+    hops = []
+    for h in j.get('result') or ():
+        if 'result' not in h:
+            continue
+        for reply in h['result']:
+            if 'from' in reply and 'late' not in reply:
+                icmp_type, icmp_code = atlas_icmp(family, reply, dst, icmp)
+                hops.append({
+                    'addr': reply['from'], 'probe_ttl': h['hop'], 'rtt': reply.get('rtt', -1),
+                    'reply_ttl': reply.get('ttl', 0), 'reply_size': reply.get('size', 0),
+                    'icmp_type': icmp_type, 'icmp_code': icmp_code, 'icmp_q_ttl': reply.get('ittl', 1),
+                    'icmpext': atlas_icmpext(reply.get('icmpext'))
+                })
+                break
+    return hops
+
+
+def atlas_trace(j: dict) -> Optional[WartsTrace]:
+    dst = j.get('dst_addr')
+    if j.get('type') != 'traceroute' or not dst:
+        return None
+    return WartsTrace(
+        type='trace', method=j.get('proto', ''), src=j.get('src_addr') or '', dst=dst,
+        start={'sec': j.get('timestamp', 0)}, hops=atlas_hops(j), id=j.get('msm_id', -1)
+    )
+
+
+class AtlasTraceReader:
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.f = None
+        self.p = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        cmd = decompressor() if self.filename.endswith('.bz2') else None
+        if cmd is not None:
+            self.p = Popen([cmd, '-d', '-c', self.filename], stdout=PIPE)
+            self.f = self.p.stdout
+        else:
+            self.f = File2(self.filename, 'rb')
+            self.f.open()
+
+    def close(self):
+        self.f.close()
+        if self.p is not None:
+            self.p.wait()
+            self.p = None
+
+    def json(self) -> Iterator[dict]:
+        for line in self.f:
+            try:
+                j = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            if isinstance(j, list):
+                yield from j
+            else:
+                yield j
+
+    def __iter__(self) -> Iterator[WartsTrace]:
+        for j in self.json():
+            trace = atlas_trace(j)
+            if trace is not None:
+                yield trace
+
+
+READERS = {'warts': WartsReader, 'wartsjson': WartsJsonReader, 'atlas': AtlasTraceReader}
+
+
+def open_reader(filename, ftype=None):
+    if ftype is None or ftype == 'auto':
+        ftype = file_type(filename)
+    return READERS[ftype](filename)
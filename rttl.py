@@ -0,0 +1,101 @@
+from typing import Iterable, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Reply TTLs fit in a byte, so differences fall in [-255, 255]
+DIFF_OFFSET = 256
+DIFF_RANGE = 2 * DIFF_OFFSET
+
+
+def ttl_column(values, n):
+    return np.fromiter((-1 if v is None else v for v in values), dtype=np.int16, count=n)
+
+
+class RTTLTable:
+
+    def __init__(self, addrs: np.ndarray, w: np.ndarray, x: np.ndarray, y: np.ndarray, ttls: np.ndarray):
+        self.addrs = addrs
+        self.w = w
+        self.x = x
+        self.y = y
+        self.ttls = ttls
+        self.pairs = None
+        self.counts = None
+        self.compared = None
+        self.same = None
+        self.distinct = None
+        self.mindiff = None
+        self.maxdiff = None
+
+    def __len__(self):
+        return len(self.x)
+
+    def __repr__(self):
+        pairs = len(self.pairs) if self.pairs is not None else 0
+        same = int(self.same_router_mask().sum()) if self.pairs is not None else 0
+        return 'Tuples {:,d} Pairs {:,d} Same {:,d}'.format(len(self.x), pairs, same)
+
+    @classmethod
+    def from_tuples(cls, rttls: Iterable[Tuple]):
+        rttls = rttls if isinstance(rttls, (list, set)) else list(rttls)
+        n = len(rttls)
+        ws, xs, ys, wts, xts, yts = zip(*rttls) if n else ([], [], [], [], [], [])
+        codes, addrs = pd.factorize(np.array(ws + xs + ys, dtype=object))
+        codes = codes.reshape(3, n)
+        ttls = np.stack([ttl_column(wts, n), ttl_column(xts, n), ttl_column(yts, n)], axis=1)
+        return cls(np.asarray(addrs, dtype=object), codes[0], codes[1], codes[2], ttls)
+
+    def diffs(self):
+        wttl = self.ttls[:, 0].astype(np.int32)
+        yttl = self.ttls[:, 2].astype(np.int32)
+        valid = (self.w >= 0) & (wttl >= 0) & (yttl >= 0)
+        return wttl - yttl, valid
+
+    def group(self):
+        # Group by (x, y) with one sort over packed int64 keys instead of a dict of sets
+        n = len(self.addrs)
+        key = self.x.astype(np.int64) * n + self.y
+        pairs, inverse = np.unique(key, return_inverse=True)
+        inverse = inverse.ravel()
+        npairs = len(pairs)
+        diff, valid = self.diffs()
+        self.pairs = np.stack([pairs // n, pairs % n], axis=1)
+        self.counts = np.bincount(inverse, minlength=npairs)
+        self.compared = np.bincount(inverse[valid], minlength=npairs)
+        self.same = np.bincount(inverse[valid & (diff == 0)], minlength=npairs)
+        packed = np.unique(inverse[valid].astype(np.int64) * DIFF_RANGE + diff[valid] + DIFF_OFFSET)
+        gids = packed // DIFF_RANGE
+        values = packed % DIFF_RANGE - DIFF_OFFSET
+        self.distinct = np.bincount(gids, minlength=npairs)
+        self.mindiff = np.zeros(npairs, dtype=np.int16)
+        self.maxdiff = np.zeros(npairs, dtype=np.int16)
+        if len(packed):
+            starts = np.flatnonzero(np.r_[True, gids[1:] != gids[:-1]])
+            ends = np.r_[starts[1:], len(packed)] - 1
+            self.mindiff[gids[starts]] = values[starts]
+            self.maxdiff[gids[ends]] = values[ends]
+        return self
+
+    def same_router_mask(self) -> np.ndarray:
+        # W and Y always answered with the same reply TTL, as if both hops were the same router
+        return (self.compared > 0) & (self.same == self.compared)
+
+    def same_router(self) -> Set[str]:
+        # Only prune an address when every (x, y) pair it appears in has the same-router signature
+        n = len(self.addrs)
+        xs = self.pairs[:, 0]
+        total = np.bincount(xs, minlength=n)
+        same = np.bincount(xs[self.same_router_mask()], minlength=n)
+        return set(self.addrs[np.flatnonzero((total > 0) & (same == total))].tolist())
+
+    def distribution(self) -> pd.Series:
+        return pd.Series(self.distinct).value_counts().sort_index()
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            'x': self.addrs[self.pairs[:, 0]], 'y': self.addrs[self.pairs[:, 1]], 'count': self.counts, 'compared': self.compared,
+            'same': self.same, 'distinct': self.distinct, 'mindiff': self.mindiff, 'maxdiff': self.maxdiff, 'samerouter': self.same_router_mask()
+        })
+
@@ -1,10 +1,14 @@
+#!/usr/bin/env python
+from argparse import ArgumentParser
 from multiprocessing.pool import Pool
 from typing import List
 
 from traceutils.progress.bar import Progress
-from traceutils.scamper.warts import WartsReader
+from traceutils.scamper.warts import WartsJsonReader, WartsReader, WartsTrace
 
 from finder import WartsFile
+from readers import AtlasTraceReader, file_type
+from traceindex import TraceIndex
 
 
 def search(filename, ip2as=None):
@@ -67,3 +71,53 @@ def search_parallel(filenames: List[WartsFile], ip2as=None, poolsize=35):
             if trace is not None:
                 return wf, trace
     return None
+
+
+def fetch(filename, records: List[int]):
+    records = set(records)
+    last = max(records)
+    traces = []
+    record = 0
+    ftype = file_type(filename)
+    if ftype == 'atlas':
+        with AtlasTraceReader(filename) as f:
+            for record, trace in enumerate(f):
+                if record in records:
+                    traces.append((record, trace))
+                if record == last:
+                    break
+        return traces
+    reader = WartsJsonReader if ftype == 'wartsjson' else WartsReader
+    with reader(filename) as f:
+        for j in f.json():
+            rtype = j['type']
+            if rtype != 'trace' and rtype != 'ping':
+                continue
+            if record in records and rtype == 'trace':
+                traces.append((record, WartsTrace(**j)))
+            if record == last:
+                break
+            record += 1
+    return traces
+
+
+def search_index(index: TraceIndex, x, y=None):
+    for filename, records in index.lookup(x, y).items():
+        for record, trace in fetch(filename, records):
+            yield filename, record, trace
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-x', '--index', required=True, help='Index written by finder.py --index.')
+    parser.add_argument('-a', '--addr', required=True)
+    parser.add_argument('-b', '--next-addr', help='Only show traces where this address follows --addr.')
+    args = parser.parse_args()
+    index = TraceIndex.load(args.index)
+    for filename, record, trace in search_index(index, args.addr, args.next_addr):
+        print('{} #{:d} {} -> {}'.format(filename, record, trace.src, trace.dst))
+        print(trace)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+import gzip
+import os
+import pickle
+import random
+import zlib
+from argparse import ArgumentParser
+from collections import defaultdict, deque
+from ipaddress import IPv4Address
+from multiprocessing.pool import Pool
+from typing import Dict, List, Optional, Set
+
+import orjson
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
+
+from alias import Alias
+
+
+ASBASE = 40 << 24
+IXBASE = 60 << 24
+VPBASE = 80 << 24
+FIRST_ASN = 1000
+
+_sim: Optional['Simulator'] = None
+
+
+def ntoa(n: int):
+    return str(IPv4Address(n))
+
+
+class Topology:
+
+    def __init__(self, ases=50, routers=20, ixps=5, slash31=0.3, vrf=0.1, unresponsive=0.05, noping=0.1, seed=0):
+        rng = random.Random(seed)
+        self.ases = ases
+        self.router_as: List[int] = []
+        self.neighbors: List[Dict[int, str]] = []
+        self.vrf: Set[int] = set()
+        self.unresponsive: Set[int] = set()
+        self.noping: Set[int] = set()
+        self.prefixes: Dict[str, int] = {}
+        self.hosts: List[int] = []
+        self.host_router: List[int] = []
+        self.linkcount = defaultdict(int)
+        self.slash31 = slash31
+        self.rng = rng
+        members = []
+        for a in range(ases):
+            asn = FIRST_ASN + a
+            self.prefixes['{}/16'.format(ntoa(ASBASE + (a << 16)))] = asn
+            first = len(self.router_as)
+            for r in range(routers):
+                rid = self.add_router(a)
+                if r > 0:
+                    self.add_link(rid, first + rng.randrange(r), a)
+            for _ in range(routers // 4):
+                x, y = rng.sample(range(first, first + routers), 2)
+                if y not in self.neighbors[x]:
+                    self.add_link(x, y, a)
+            for h in range(routers):
+                self.hosts.append(ASBASE + (a << 16) + ((128 + h) << 8) + 1)
+                self.host_router.append(first + rng.randrange(routers))
+            members.append(list(range(first, first + routers)))
+        for a in range(1, ases):
+            for b in rng.sample(range(a), min(a, 2)):
+                x, y = rng.choice(members[a]), rng.choice(members[b])
+                if y not in self.neighbors[x]:
+                    self.add_link(x, y, b)
+        self.ixps: Dict[int, List[int]] = {}
+        self.ixpaddrs: Dict[str, int] = {}
+        for i in range(ixps):
+            ixid = i + 1
+            prefix = IXBASE + (ixid << 8)
+            self.prefixes['{}/24'.format(ntoa(prefix))] = -(100 + ixid)
+            routers_ix = [rng.choice(members[a]) for a in rng.sample(range(ases), min(ases, 8))]
+            addrs = {r: ntoa(prefix + 1 + j) for j, r in enumerate(routers_ix)}
+            for r, addr in addrs.items():
+                self.ixpaddrs[addr] = FIRST_ASN + self.router_as[r]
+            for x in routers_ix:
+                for y in routers_ix:
+                    if x != y and y not in self.neighbors[x]:
+                        self.neighbors[x][y] = addrs[x]
+            self.ixps[ixid] = routers_ix
+        nrouters = len(self.router_as)
+        self.vrf = set(rng.sample(range(nrouters), int(nrouters * vrf)))
+        self.unresponsive = set(rng.sample(range(nrouters), int(nrouters * unresponsive)))
+        self.noping = set(rng.sample(range(nrouters), int(nrouters * noping)))
+        self.addr_router = {addr: r for r, nbrs in enumerate(self.neighbors) for addr in nbrs.values()}
+        self.host_index = {ntoa(h): i for i, h in enumerate(self.hosts)}
+
+    def __repr__(self):
+        return 'Routers {:,d} Links {:,d} Hosts {:,d} VRF {:,d}'.format(len(self.router_as), sum(len(n) for n in self.neighbors) // 2, len(self.hosts), len(self.vrf))
+
+    def add_router(self, a):
+        self.router_as.append(a)
+        self.neighbors.append({})
+        return len(self.router_as) - 1
+
+    def add_link(self, x, y, a):
+        base = ASBASE + (a << 16) + 4 * self.linkcount[a]
+        self.linkcount[a] += 1
+        if self.rng.random() < self.slash31:
+            xaddr, yaddr = base, base + 1
+        else:
+            xaddr, yaddr = base + 1, base + 2
+        self.neighbors[x][y] = ntoa(xaddr)
+        self.neighbors[y][x] = ntoa(yaddr)
+
+    def paths(self, src: int) -> List[int]:
+        parent = [-1] * len(self.router_as)
+        parent[src] = src
+        queue = deque([src])
+        while queue:
+            x = queue.popleft()
+            for y in self.neighbors[x]:
+                if parent[y] < 0:
+                    parent[y] = x
+                    queue.append(y)
+        return parent
+
+    def forwarding_addrs(self) -> Set[str]:
+        return {addr for r in self.vrf for addr in self.neighbors[r].values()}
+
+    def alias(self) -> Alias:
+        alias = Alias()
+        for r, nbrs in enumerate(self.neighbors):
+            addrs = set(nbrs.values())
+            if addrs:
+                nid = 'N{}'.format(r + 1)
+                alias.node[nid] = addrs
+                for addr in addrs:
+                    alias.nid[addr] = nid
+        return alias
+
+
+def hop_record(addr, ttl, back, icmp_type=11, initial=255):
+    return {
+        'addr': addr, 'probe_ttl': ttl, 'probe_id': 1, 'probe_size': 44, 'rtt': round(0.5 + 2 * back, 3),
+        'reply_ttl': max(1, initial - back), 'reply_tos': 0, 'reply_size': 56 if icmp_type == 11 else 44,
+        'reply_ipid': 0, 'icmp_type': icmp_type, 'icmp_code': 0, 'icmp_q_ttl': 1, 'icmp_q_ipl': 44, 'icmp_q_tos': 0
+    }
+
+
+class Simulator:
+
+    def __init__(self, topo: Topology, nvps=10, loops=0.01, unreachable=0.1, seed=0):
+        self.topo = topo
+        rng = random.Random(seed)
+        self.seed = seed
+        self.loops = loops
+        self.unreachable = set(rng.sample(range(len(topo.hosts)), int(len(topo.hosts) * unreachable)))
+        self.vps = {}
+        for i in range(nvps):
+            vp = 'vp{}-sim'.format(i + 1)
+            self.vps[vp] = (rng.randrange(len(topo.router_as)), ntoa(VPBASE + 4 * i + 2), ntoa(VPBASE + 4 * i + 1))
+
+    def trace(self, rng, vp, parent, dst: int, start: int):
+        topo = self.topo
+        router, src, gateway = self.vps[vp]
+        dstrouter = topo.host_router[dst]
+        path = [dstrouter]
+        while path[-1] != router:
+            path.append(parent[path[-1]])
+        path.reverse()
+        if rng.random() < self.loops and len(path) >= 3:
+            j = rng.randrange(1, len(path) - 1)
+            path = path[:j+1] + [path[j-1], path[j]] * 16
+            path = path[:32]
+            stop = 'LOOP'
+        else:
+            stop = 'COMPLETED' if dst not in self.unreachable else 'GAPLIMIT'
+        hops = []
+        for i, r in enumerate(path):
+            if r in topo.unresponsive:
+                continue
+            if i == 0:
+                addr = gateway
+            elif r in topo.vrf and i + 1 < len(path) and path[i+1] in topo.neighbors[r]:
+                addr = topo.neighbors[r][path[i+1]]
+            else:
+                addr = topo.neighbors[r][path[i-1]]
+            hops.append(hop_record(addr, i + 1, i))
+        dstaddr = ntoa(topo.hosts[dst])
+        if stop == 'COMPLETED':
+            hops.append(hop_record(dstaddr, len(path) + 1, len(path), icmp_type=0, initial=64))
+        return {
+            'type': 'trace', 'version': '0.1', 'userid': 0, 'method': 'icmp-echo-paris', 'src': src, 'dst': dstaddr,
+            'icmp_sum': 0, 'stop_reason': stop, 'stop_data': 0, 'start': {'sec': start, 'usec': 0, 'ftime': ''},
+            'hop_count': len(path) + 1, 'attempts': 2, 'hoplimit': 0, 'firsthop': 1, 'wait': 5, 'wait_probe': 0,
+            'tos': 0, 'probe_size': 44, 'probe_count': len(path) + 1, 'hops': hops
+        }
+
+    def ping(self, vp, parent, addr: str, start: int):
+        topo = self.topo
+        router, src, _ = self.vps[vp]
+        r = topo.addr_router.get(addr)
+        if r is None:
+            host = topo.host_index.get(addr)
+            responds = host is not None and host not in self.unreachable
+            r = topo.host_router[host] if host is not None else None
+            initial = 64
+        else:
+            responds = r not in topo.noping and r not in topo.unresponsive
+            initial = 255
+        responses = []
+        if responds and parent[r] >= 0:
+            back = 0
+            x = r
+            while x != router:
+                x = parent[x]
+                back += 1
+            for seq in range(2):
+                responses.append({
+                    'from': addr, 'seq': seq, 'reply_size': 84, 'reply_ttl': initial - back, 'reply_proto': 'icmp',
+                    'rtt': round(0.5 + 2 * back, 3), 'probe_ipid': seq, 'reply_ipid': 0, 'icmp_type': 0, 'icmp_code': 0
+                })
+        return {
+            'type': 'ping', 'version': '0.4', 'method': 'icmp-echo', 'src': src, 'dst': addr,
+            'start': {'sec': start, 'usec': 0, 'ftime': ''}, 'ping_sent': 2, 'probe_size': 84, 'userid': 0, 'ttl': 64,
+            'wait': 1, 'timeout': 1, 'responses': responses,
+            'statistics': {'replies': len(responses), 'loss': 2 - len(responses)}
+        }
+
+    def write(self, filename, vp, records):
+        with gzip.open(filename, 'wb', compresslevel=1) as f:
+            f.write(orjson.dumps({'type': 'cycle-start', 'list_name': 'sim', 'id': 1, 'hostname': vp, 'start_time': 0}) + b'\n')
+            for record in records:
+                f.write(orjson.dumps(record) + b'\n')
+        return filename
+
+    def traces_vp(self, vp, directory):
+        rng = random.Random(zlib.crc32(vp.encode()) ^ self.seed)
+        parent = self.topo.paths(self.vps[vp][0])
+        order = list(range(len(self.topo.hosts)))
+        rng.shuffle(order)
+        records = (self.trace(rng, vp, parent, dst, i) for i, dst in enumerate(order))
+        return self.write(os.path.join(directory, '{}.trace.warts.json.gz'.format(vp)), vp, records)
+
+    def pings_vp(self, vp, directory, addrs: List[str]):
+        parent = self.topo.paths(self.vps[vp][0])
+        records = (self.ping(vp, parent, addr, i) for i, addr in enumerate(addrs))
+        return self.write(os.path.join(directory, '{}.ping.warts.json.gz'.format(vp)), vp, records)
+
+    def run(self, directory, ctype='trace', addrs: List[str] = None, poolsize=10):
+        global _sim
+        _sim = self
+        os.makedirs(directory, exist_ok=True)
+        jobs = [(vp, directory, ctype, addrs) for vp in sorted(self.vps)]
+        filenames = []
+        pb = Progress(len(jobs), 'Simulating {}'.format(ctype))
+        with Pool(max(1, min(poolsize, len(jobs)))) as pool:
+            for filename in pb.iterator(pool.imap_unordered(run_vp, jobs)):
+                filenames.append(filename)
+        return sorted(filenames)
+
+
+def run_vp(args):
+    vp, directory, ctype, addrs = args
+    if ctype == 'trace':
+        return _sim.traces_vp(vp, directory)
+    return _sim.pings_vp(vp, directory, addrs)
+
+
+def write_lines(filename, lines):
+    with File2(filename, 'wt') as f:
+        f.writelines('{}\n'.format(line) for line in lines)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-o', '--output-dir', required=True)
+    parser.add_argument('-a', '--ases', type=int, default=50)
+    parser.add_argument('-r', '--routers', type=int, default=20, help='Routers per AS.')
+    parser.add_argument('-x', '--ixps', type=int, default=5)
+    parser.add_argument('-n', '--vps', type=int, default=10)
+    parser.add_argument('--vrf', type=float, default=0.1, help='Fraction of routers replying with the forwarding address.')
+    parser.add_argument('--slash31', type=float, default=0.3)
+    parser.add_argument('--loops', type=float, default=0.01)
+    parser.add_argument('-t', '--targets', help='Also simulate pings to the addresses in this file.')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-p', '--poolsize', type=int, default=10)
+    args = parser.parse_args()
+    topo = Topology(ases=args.ases, routers=args.routers, ixps=args.ixps, slash31=args.slash31, vrf=args.vrf, seed=args.seed)
+    print(topo)
+    sim = Simulator(topo, nvps=args.vps, loops=args.loops, seed=args.seed)
+    directory = args.output_dir
+    traces = sim.run(os.path.join(directory, 'traces'), poolsize=args.poolsize)
+    write_lines(os.path.join(directory, 'traces.txt'), traces)
+    write_lines(os.path.join(directory, 'ip2as.prefixes'), ('{} {}'.format(p, asn) for p, asn in topo.prefixes.items()))
+    write_lines(os.path.join(directory, 'vps.txt'), sorted(sim.vps))
+    topo.alias().write(os.path.join(directory, 'nodes.txt'))
+    with open(os.path.join(directory, 'truth.pickle'), 'wb') as f:
+        pickle.dump({'forwarding': topo.forwarding_addrs(), 'ixpaddrs': topo.ixpaddrs}, f)
+    if args.targets:
+        with File2(args.targets) as f:
+            addrs = [line.strip() for line in f if line.strip()]
+        pings = sim.run(os.path.join(directory, 'pings'), ctype='ping', addrs=addrs, poolsize=args.poolsize)
+        write_lines(os.path.join(directory, 'pings.txt'), pings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+import pickle
+from argparse import ArgumentParser
+from itertools import product
+from multiprocessing.pool import Pool
+from typing import Dict, List, Optional, Union
+
+import pandas as pd
+from traceutils.as2org.as2org import AS2Org
+from traceutils.file2.file2 import File2
+from traceutils.ixps.ixps import PeeringDB
+from traceutils.progress.bar import Progress
+from traceutils.radix.ip2as import create_table
+
+from alias import Alias
+from candidate_info import CandidateInfo
+from orgs import OrgMap, PeeringOrgs
+from validate import Validate
+
+
+_sweep: Optional['Sweep'] = None
+
+FAMILIES = {'all': (True, True), 'ipv4': (True, False), 'ipv6': (False, True)}
+
+
+def variants(pingtest=(True, False), alias=(None,), family=('all',), middle_only=(False,)):
+    return [
+        {'pingtest': p, 'alias': a, 'family': f, 'middle_only': m}
+        for p, a, f, m in product(pingtest, alias, family, middle_only)
+    ]
+
+
+class Truth:
+
+    def __init__(self, validate: Validate, vpn, default, prev, tasn, ixps=None):
+        self.validate = validate
+        self.vpn = vpn
+        self.default = default
+        self.prev = prev
+        self.tasn = tasn
+        self.ixps = ixps
+
+
+class Sweep:
+
+    def __init__(self, info: CandidateInfo, valid: Dict[str, int], ixpaddrs: Dict[str, int], as2org: Union[AS2Org, OrgMap], aliases: Dict[str, Alias] = None, truth: Truth = None):
+        self.info = info
+        self.valid = valid
+        self.peeringorgs = PeeringOrgs.create(ixpaddrs, as2org)
+        self.aliases = aliases if aliases is not None else {}
+        self.truth = truth
+        self.alladdrs = info.alladdrs() if truth is not None else None
+        self.middle = info.middle_echo()
+
+    def run_variant(self, variant):
+        info = CandidateInfo.duplicate(self.info)
+        ipv4, ipv6 = FAMILIES[variant['family']]
+        info.prune_family(ipv4=ipv4, ipv6=ipv6)
+        if variant['middle_only']:
+            info.prune_middle(self.middle)
+        valid = self.valid if variant['pingtest'] else None
+        alias = self.aliases[variant['alias']] if variant['alias'] is not None else None
+        info.prune_all(valid, ixpaddrs=self.peeringorgs, as2org=self.peeringorgs.orgmap, alias=alias)
+        row = info.row(percent=True, middle=self.middle)
+        for k, v in variant.items():
+            row[k] = v
+        if self.truth is not None:
+            t = self.truth
+            ixps = set(info.ixps) if t.ixps is None else set(info.ixps) & t.ixps
+            vi = t.validate.validate(self.alladdrs, info, t.vpn, t.default, ixps, t.prev, t.tasn)
+            row = pd.concat([row, vi.series()])
+        return row
+
+    def run(self, variants: List[dict], poolsize=10):
+        global _sweep
+        _sweep = self
+        rows = []
+        pb = Progress(len(variants), 'Sweeping')
+        with Pool(max(1, min(poolsize, len(variants)))) as pool:
+            for row in pb.iterator(pool.imap(run_variant, variants)):
+                rows.append(row)
+        return pd.DataFrame(rows).reset_index(drop=True)
+
+
+def run_variant(variant):
+    return _sweep.run_variant(variant)
+
+
+def read_addrs(filename):
+    with File2(filename) as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-c', '--candidates', required=True)
+    parser.add_argument('-v', '--valid', required=True, help='Pickled ping test results from PingTest.test_candidates.')
+    parser.add_argument('-x', '--ixpaddrs', required=True, help='Pickled PeeringDB address to ASN dict.')
+    parser.add_argument('-a', '--as2org', required=True)
+    parser.add_argument('-l', '--aliases', nargs='*', default=[], help='Alias files as name=filename.')
+    parser.add_argument('-f', '--families', nargs='*', default=['all', 'ipv4', 'ipv6'], choices=list(FAMILIES))
+    parser.add_argument('-p', '--poolsize', type=int, default=10)
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--vpn', help='Ground truth VRF addresses, one per line.')
+    parser.add_argument('--default', help='Ground truth non-VRF addresses, one per line.')
+    parser.add_argument('--ixps', help='Ground truth IXP addresses, one per line. Defaults to the IXP candidates left after pruning.')
+    parser.add_argument('--prev', help='Pickled finder output whose tuples give the previous hops. Defaults to the candidates file tuples.')
+    parser.add_argument('--tasn', type=int, help='ASN of the ground truth network.')
+    parser.add_argument('--ip2as', help='Prefix to AS file for ground truth validation.')
+    parser.add_argument('--peeringdb', help='PeeringDB json for ground truth validation.')
+    args = parser.parse_args()
+    gtargs = [args.vpn, args.default, args.tasn, args.ip2as, args.peeringdb]
+    if any(a is not None for a in gtargs + [args.ixps, args.prev]) and any(a is None for a in gtargs):
+        parser.error('Ground truth validation requires --vpn, --default, --tasn, --ip2as and --peeringdb')
+    info = CandidateInfo.load(args.candidates)
+    with open(args.valid, 'rb') as f:
+        valid = pickle.load(f)
+    with open(args.ixpaddrs, 'rb') as f:
+        ixpaddrs = pickle.load(f)
+    orgmap = OrgMap.create(AS2Org(args.as2org))
+    aliases = {}
+    for a in args.aliases:
+        name, _, filename = a.partition('=')
+        aliases[name] = Alias(filename)
+    truth = None
+    if args.vpn is not None:
+        validate = Validate(create_table(args.ip2as), orgmap, PeeringDB(args.peeringdb))
+        ixps = read_addrs(args.ixps) if args.ixps else None
+        truth = Truth(validate, read_addrs(args.vpn), read_addrs(args.default), info.prev(filename=args.prev), args.tasn, ixps=ixps)
+    sweep = Sweep(info, valid, ixpaddrs, orgmap, aliases=aliases, truth=truth)
+    vs = variants(alias=[None, *aliases], family=args.families, middle_only=(False, True))
+    df = sweep.run(vs, poolsize=args.poolsize)
+    df.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+import bz2
+import gzip
+import os
+import zlib
+from argparse import ArgumentParser
+from multiprocessing.pool import Pool
+from typing import Iterable, List, Optional
+
+import numpy as np
+from traceutils.file2.file2 import File2
+from traceutils.progress.bar import Progress
+
+
+GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+ROUNDS = 4
+
+_targets: Optional['Targets'] = None
+
+
+def round_keys(seed: int):
+    keys = []
+    x = seed & 0xFFFFFFFFFFFFFFFF
+    for _ in range(ROUNDS):
+        x = (x * 6364136223846793005 + 1442695040888963407) & 0xFFFFFFFFFFFFFFFF
+        keys.append(np.uint64(x))
+    return keys
+
+
+def feistel(idx: np.ndarray, half: int, keys) -> np.ndarray:
+    halfmask = np.uint64((1 << half) - 1)
+    shift = np.uint64(half)
+    left = idx >> shift
+    right = idx & halfmask
+    with np.errstate(over='ignore'):
+        for key in keys:
+            f = (right + key) * GOLDEN
+            f ^= f >> np.uint64(29)
+            left, right = right, (left ^ f) & halfmask
+    return (left << shift) | right
+
+
+def permutation(n: int, seed: int) -> np.ndarray:
+    half = max(1, ((max(n, 2) - 1).bit_length() + 1) // 2)
+    keys = round_keys(seed)
+    order = feistel(np.arange(n, dtype=np.uint64), half, keys)
+    outside = np.flatnonzero(order >= n)
+    while len(outside):
+        order[outside] = feistel(order[outside], half, keys)
+        outside = outside[order[outside] >= n]
+    return order.astype(np.int64)
+
+
+def vp_seed(vp: str, seed: int = 0):
+    return zlib.crc32(vp.encode()) ^ (seed << 32)
+
+
+def target_filename(directory, vp, compress=None):
+    filename = os.path.join(directory, '{}.addrs'.format(vp))
+    if compress:
+        filename += '.{}'.format(compress)
+    return filename
+
+
+def open_target(filename, compress=None, bufsize=1 << 22):
+    if compress == 'gz':
+        return gzip.open(filename, 'wb', compresslevel=6)
+    if compress == 'bz2':
+        return bz2.open(filename, 'wb')
+    return open(filename, 'wb', buffering=bufsize)
+
+
+class Targets:
+
+    def __init__(self, addrs: Iterable[str]):
+        self.addrs = np.array(sorted({'{}\n'.format(a).encode() for a in addrs}), dtype=np.bytes_)
+
+    def __len__(self):
+        return len(self.addrs)
+
+    def __repr__(self):
+        return 'Targets {:,d}'.format(len(self.addrs))
+
+    def write(self, filename, seed: int, compress=None, chunksize=1000000):
+        order = permutation(len(self.addrs), seed)
+        with open_target(filename, compress=compress) as f:
+            for i in range(0, len(order), chunksize):
+                f.write(b''.join(self.addrs[order[i:i+chunksize]].tolist()))
+        return filename
+
+
+def write_target_vp(args):
+    vp, directory, seed, compress = args
+    filename = target_filename(directory, vp, compress=compress)
+    return _targets.write(filename, vp_seed(vp, seed), compress=compress)
+
+
+def write_targets(addrs, directory, vps: List[str], seed=0, compress=None, poolsize=20):
+    global _targets
+    _targets = addrs if isinstance(addrs, Targets) else Targets(addrs)
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(vp, directory, seed, compress) for vp in vps]
+    filenames = []
+    pb = Progress(len(jobs), 'Writing', callback=_targets.__repr__)
+    with Pool(max(1, min(poolsize, len(jobs)))) as pool:
+        for filename in pb.iterator(pool.imap_unordered(write_target_vp, jobs)):
+            filenames.append(filename)
+    return filenames
+
+
+def read_vps(vps):
+    if os.path.exists(vps):
+        with File2(vps) as f:
+            return [line.strip() for line in f if line.strip()]
+    return [vp for vp in vps.split(',') if vp]
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('-a', '--addrs', required=True, help='File with one target address per line.')
+    parser.add_argument('-v', '--vps', required=True, help='Comma separated VPs, or a file with one VP per line.')
+    parser.add_argument('-o', '--output-dir', required=True)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-z', '--compress', choices=['gz', 'bz2'])
+    parser.add_argument('-p', '--poolsize', type=int, default=20)
+    args = parser.parse_args()
+    with File2(args.addrs) as f:
+        addrs = {line.strip() for line in f if line.strip()}
+    vps = read_vps(args.vps)
+    print('Addrs: {:,d} VPs: {:,d}'.format(len(addrs), len(vps)))
+    write_targets(addrs, args.output_dir, vps, seed=args.seed, compress=args.compress, poolsize=args.poolsize)
+
+
+if __name__ == '__main__':
+    main()
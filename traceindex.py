@@ -0,0 +1,76 @@
+import pickle
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+class TraceIndex:
+
+    def __init__(self, maxrefs=10):
+        self.maxrefs = maxrefs
+        self.files: List[str] = []
+        self.fileids: Dict[str, int] = {}
+        self.refs: Dict[Tuple[str, str], List[Tuple[int, int]]] = defaultdict(list)
+        self._addrs = None
+
+    def __repr__(self):
+        return 'Files {:,d} Pairs {:,d}'.format(len(self.files), len(self.refs))
+
+    def fileid(self, filename):
+        fid = self.fileids.get(filename)
+        if fid is None:
+            fid = len(self.files)
+            self.files.append(filename)
+            self.fileids[filename] = fid
+        return fid
+
+    def update(self, filename, records: Dict[Tuple[str, str], List[int]]):
+        fid = self.fileid(filename)
+        for pair, recs in records.items():
+            refs = self.refs[pair]
+            for record in recs:
+                if len(refs) >= self.maxrefs:
+                    break
+                refs.append((fid, record))
+        self._addrs = None
+
+    def addrs(self):
+        if self._addrs is None:
+            self._addrs = defaultdict(set)
+            for x, y in self.refs:
+                self._addrs[x].add((x, y))
+                self._addrs[y].add((x, y))
+        return self._addrs
+
+    def lookup(self, x, y=None) -> Dict[str, List[int]]:
+        if y is not None:
+            pairs = [(x, y)]
+        else:
+            pairs = self.addrs().get(x, ())
+        found = defaultdict(list)
+        for pair in pairs:
+            for fid, record in self.refs.get(pair, ()):
+                found[self.files[fid]].append(record)
+        return {filename: sorted(set(records)) for filename, records in found.items()}
+
+    def dump(self, filename):
+        d = {'maxrefs': self.maxrefs, 'files': self.files, 'refs': dict(self.refs)}
+        with open(filename, 'wb') as f:
+            pickle.dump(d, f)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as f:
+            d = pickle.load(f)
+        index = cls(maxrefs=d['maxrefs'])
+        for filename in d['files']:
+            index.fileid(filename)
+        index.refs.update(d['refs'])
+        return index
+
+
+def add_record(records: Dict[Tuple[str, str], List[int]], x: str, y: str, record: int, maxrefs=10):
+    recs = records.get((x, y))
+    if recs is None:
+        records[x, y] = [record]
+    elif len(recs) < maxrefs and recs[-1] != record:
+        recs.append(record)
@@ -2,14 +2,17 @@ import re
 import sys
 from collections import namedtuple, Counter
 from os.path import basename
-from typing import Set, Dict, Tuple
+from typing import Set, Dict, Tuple, Union
 
 from traceutils.as2org.as2org import AS2Org
 from traceutils.ixps.ixps import PeeringDB
 from traceutils.radix.ip2as import IP2AS
 
 from alias import Alias
+from features import FeatureTable, TWO, FOUR, IXP
 from finder import CandidateInfo
+from orgs import OrgMap, PeeringOrgs
+import numpy as np
 import pandas as pd
 
 
@@ -36,6 +39,24 @@ def detect(addr, candidates, valid=None, trippairs=None, aliases=None, ixps=None
     return pos
 
 
+def detect_row(features: FeatureTable, i, addr, aliases=None, ixps=None):
+    # detect() with twos/fours membership, the ping test code and the trippairs read from the feature table
+    pos = False
+    flags = int(features.flags[i]) if i >= 0 else 0
+    if flags & TWO:
+        pos = True
+    elif flags & FOUR:
+        code = int(features.valid[i])
+        pos = code == 0 or code > 1
+    elif ixps is None or addr in ixps:
+        pos = True
+    if pos and aliases is not None:
+        pairs = features.trippairs_row(i)
+        if pairs and all(w in aliases.nid and y in aliases.nid and aliases.nid[w] == aliases.nid[y] for w, y in pairs):
+            pos = False
+    return pos
+
+
 class VerifyInfo:
     def __init__(self):
         self.tps = set()
@@ -97,34 +118,37 @@ class VerifyInfo:
 
 class Validate:
 
-    def __init__(self, ip2as: IP2AS, as2org: AS2Org, peeringdb: PeeringDB):
+    def __init__(self, ip2as: IP2AS, as2org: Union[AS2Org, OrgMap], peeringdb: PeeringDB):
         self.ip2as = ip2as
         self.as2org = as2org
         self.peeringdb = peeringdb
+        self.orgmap = OrgMap.create(as2org)
+        self.peeringorgs = PeeringOrgs.create(peeringdb, self.orgmap)
 
-    def use_addr(self, addr: str, torg: str, prev: Dict[str, Set[str]], gtaddrs: Set[str]):
+    def use_addr(self, addr: str, torg: int, prev: Dict[str, Set[str]], gtaddrs: Set[str]):
         if addr in prev:
             for x in prev[addr]:
-                asn = self.ip2as[x]
-                org = self.as2org[asn]
+                org = self.orgmap[self.ip2as[x]]
                 if org == torg:
                     return True
-                asn = self.peeringdb.addrs.get(x, 0)
-                org = self.as2org[asn]
+                org = self.peeringorgs.org(x)
                 if org == torg:
                     return True
                 if x in gtaddrs:
                     return True
         return False
 
-    def validate(self, alladdrs, candidates: CandidateInfo, vpn, default, ixps, prev, tasn, valid=None, trippairs=None, aliases: Alias=None) -> VerifyInfo:
+    def validate(self, alladdrs, candidates: CandidateInfo, vpn, default, ixps, prev, tasn, valid=None, trippairs=None, aliases: Alias=None, features: FeatureTable = None) -> VerifyInfo:
         # print('hello')
         vi = VerifyInfo()
-        torg = self.as2org[tasn]
+        torg = self.orgmap[tasn]
         gtaddrs = vpn | default
         addrs = gtaddrs & alladdrs
         for addr in addrs:
-            pos = detect(addr, candidates, valid=valid, trippairs=trippairs, aliases=aliases, ixps=ixps)
+            if features is not None:
+                pos = detect_row(features, features.row(addr), addr, aliases=aliases, ixps=ixps)
+            else:
+                pos = detect(addr, candidates, valid=valid, trippairs=trippairs, aliases=aliases, ixps=ixps)
             # pos = False
             # if addr in candidates.twos:
             #     pos = True
@@ -158,9 +182,10 @@ class Validate:
 
 class ValidateIPs:
 
-    def __init__(self, validate, candidates: CandidateInfo, prev: Dict[str, Set[str]], valid: Dict[str, bool] = None, trippairs=None, aliases: Alias = None, alladdrs=None):
+    def __init__(self, validate, candidates: CandidateInfo, prev: Dict[str, Set[str]], valid: Dict[str, bool] = None, trippairs=None, aliases: Alias = None, alladdrs=None, features: FeatureTable = None):
         self.val = validate
         self.candidates = candidates
+        self.features = features
         self.valid = valid
         self.prev = prev
         self.trippairs = trippairs
@@ -185,14 +210,17 @@ class ValidateIPs:
         return self._middleecho
 
     def validate(self, addrs, vpn, default, ixps, tasn):
-        return self.val.validate(addrs, self.candidates, vpn, default, ixps, self.prev, tasn, valid=self.valid, trippairs=self.trippairs, aliases=self.aliases)
+        return self.val.validate(addrs, self.candidates, vpn, default, ixps, self.prev, tasn, valid=self.valid, trippairs=self.trippairs, aliases=self.aliases, features=self.features)
 
     def allval(self, vpn, default, ixps, tasn):
         return self.validate(self.alladdrs, vpn, default, ixps, tasn)
 
     def breakdown(self, vpn, default, ixps, tasn):
-        allixps = self.candidates.ixpaddrs()
         val: VerifyInfo = self.validate(self.alladdrs, vpn, default, ixps, tasn)
+        if self.features is not None:
+            rows = [[addr, res, self.features.category(addr)] for res, found in [('tp', val.tps), ('fp', val.fps), ('fn', val.fns), ('tn', val.tns)] for addr in found]
+            return pd.DataFrame(rows, columns=['addr', 'result', 'category'])
+        allixps = self.candidates.ixpaddrs()
         rows = []
         for addr in val.tps | val.fps | val.fns | val.tns:
             if addr in val.tps:
@@ -222,12 +250,13 @@ class ValidateIPs:
         return pd.DataFrame(rows)
 
     def vrfinfo(self, ixps=None):
-        return VRFInfo(self.candidates, self.valid, ixps, self.trippairs, self.aliases)
+        return VRFInfo(self.candidates, self.valid, ixps, self.trippairs, self.aliases, features=self.features)
 
 
 class VRFInfo:
-    def __init__(self, candidates: CandidateInfo, valid=None, ixps=None, trippairs=None, aliases=None):
+    def __init__(self, candidates: CandidateInfo, valid=None, ixps=None, trippairs=None, aliases=None, features: FeatureTable = None):
         self.candidates = candidates
+        self.features = features
         self.valid = valid
         self.ixps = ixps
         self.trippairs = trippairs
@@ -238,6 +267,8 @@ class VRFInfo:
 
     def compute(self):
         self.vrf = {}
+        if self.features is not None:
+            return self.compute_features()
         ixpaddrs = self.candidates.ixpaddrs()
         for a in self.candidates.fours | self.candidates.twos | ixpaddrs:
             pos = detect(a, self.candidates, self.valid, self.trippairs, self.aliases, self.ixps)
@@ -253,6 +284,15 @@ class VRFInfo:
             # else:
             #     print(a)
 
+    def compute_features(self):
+        # Membership, the ping test code and the trippairs all come from the feature table columns
+        features = self.features
+        names = {'twos': 'two', 'fours': 'four', 'ixp': 'ixp'}
+        rows = np.flatnonzero(features.has(TWO | FOUR | IXP))
+        for i, a in zip(rows.tolist(), features.addrs[rows].tolist()):
+            if detect_row(features, i, a, aliases=self.aliases, ixps=self.ixps):
+                self.vrf[a] = names[features.category_row(i)]
+
     # def compute(self):
     #     self.vrf = {}
     #     ixpaddrs = self.candidates.ixpaddrs()